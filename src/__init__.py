@@ -1,16 +1,46 @@
 """
 FIPI Parser & Checker
 Система для парсинга и проверки заданий из Открытого банка ФИПИ
+
+Ход парсинга и проверки пишется в модуль logging (логгеры пакета на уровне INFO).
+Чтобы видеть прогресс: logging.basicConfig(level=logging.INFO)
 """
 
 __version__ = "1.0.0"
 
+import importlib
+
 from .config import BASE_URL, SUBJECTS
-from .models import Task, TaskType, CheckResult
-from .parser import FIPIParser
-from .checker import FIPIChecker, AnswerHelper
-from .standalone_checker import StandaloneChecker, CookieManager, print_result
-from .utils import FileManager
+from .models import Task, TaskType, CheckResult, dump_many
+
+# Модули с тяжёлыми зависимостями (requests, bs4) импортируются
+# при первом обращении к их атрибутам (PEP 562)
+_LAZY_ATTRS = {
+    'FIPIParser': '.parser',
+    'FIPIChecker': '.checker',
+    'AnswerHelper': '.checker',
+    'StandaloneChecker': '.standalone_checker',
+    'CookieManager': '.standalone_checker',
+    'print_result': '.standalone_checker',
+    'FileManager': '.utils',
+    'create_session': '.session',
+    'PageCache': '.session',
+    'RateLimiter': '.session',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Следующие обращения идут мимо __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
 
 __all__ = [
     'BASE_URL',
@@ -18,6 +48,7 @@ __all__ = [
     'Task',
     'TaskType',
     'CheckResult',
+    'dump_many',
     'FIPIParser',
     'FIPIChecker',
     'AnswerHelper',
@@ -25,5 +56,8 @@ __all__ = [
     'CookieManager',
     'print_result',
     'FileManager',
+    'create_session',
+    'PageCache',
+    'RateLimiter',
 ]
 
@@ -1,8 +1,11 @@
 """
 Модуль для проверки решений заданий ФИПИ
 """
-import time
-from typing import Optional, Dict, Any
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import quote_plus
 import requests
 import urllib3
 
@@ -10,31 +13,191 @@ import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from .config import (
-    BASE_URL, SOLVE_ENDPOINT, SUBJECTS,
-    REQUEST_TIMEOUT, REQUEST_DELAY, HEADERS, RESULT_CODES
+    BASE_URL, SOLVE_ENDPOINT, get_subject,
+    REQUEST_TIMEOUT, RESULT_CODES, CHECK_WORKERS, MATCHING_LETTERS
 )
 from .models import Task, TaskType, CheckResult, CheckResponse
+from .session import create_session, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Код ответа сервера -> CheckResult (строится один раз при импорте)
+RESULT_CODE_MAP = {code: CheckResult(value) for code, value in RESULT_CODES.items()}
+
+# Сколько отформатированных ответов держать в кэше format_answer
+FORMAT_CACHE_SIZE = 4096
+
+# Заголовок для тела запроса, закодированного заранее
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+# Буквы, которые AnswerHelper.parse_matching_answer сопоставляет цифрам ответа
+MATCHING_ANSWER_LETTERS = MATCHING_LETTERS[:5]
+
+
+def _format_multiple_choice_bits(indices, num_variants: int) -> str:
+    """Бинарная строка ответа: '1' на позициях выбранных вариантов"""
+    if 0 < num_variants <= 63:
+        # Обычный случай: собираем битовую маску (первый вариант - старший бит)
+        mask = 0
+        for idx in indices:
+            if 0 <= idx < num_variants:
+                mask |= 1 << (num_variants - 1 - idx)
+        return format(mask, f'0{num_variants}b')
+    
+    bits = bytearray(b'0' * num_variants)
+    for idx in indices:
+        if 0 <= idx < num_variants:
+            bits[idx] = 0x31  # '1'
+    return bits.decode('ascii')
+
+
+def _format_matching_dict(mapping: dict) -> str:
+    """
+    Склеить ответы соответствия {буква: номер} в порядке букв
+    Обычно буквы идут подряд с 'А' - тогда сортировка не нужна
+    """
+    parts = []
+    for letter in MATCHING_LETTERS:
+        value = mapping.get(letter)
+        if value is None:
+            break
+        parts.append(str(value))
+    
+    if len(parts) == len(mapping):
+        return ''.join(parts)
+    
+    # Пропуски или нестандартные ключи - общий путь с сортировкой
+    return ''.join([str(mapping[letter]) for letter in sorted(mapping)])
+
+
+def _format_short_answer(num_variants: int, user_input: Any) -> str:
+    """Краткий ответ - просто строка"""
+    return str(user_input).strip()
+
+
+def _format_multiple_choice(num_variants: int, user_input: Any) -> str:
+    """Множественный выбор - бинарная строка"""
+    if isinstance(user_input, str):
+        # Если уже в формате бинарной строки
+        return user_input
+    
+    # user_input - список индексов выбранных вариантов
+    return _format_multiple_choice_bits(user_input, num_variants)
+
+
+def _format_matching(num_variants: int, user_input: Any) -> str:
+    """Установление соответствия - конкатенация выбранных значений"""
+    if isinstance(user_input, str):
+        # Если уже в формате строки
+        return user_input
+    
+    # user_input - словарь {буква: номер}
+    # Склеиваем номера в порядке букв
+    if isinstance(user_input, dict):
+        return _format_matching_dict(user_input)
+    
+    # user_input - список номеров в порядке А, Б, ...
+    if isinstance(user_input, (list, tuple)):
+        return ''.join(str(x) for x in user_input)
+    
+    return str(user_input)
+
+
+# Тип задания -> функция форматирования (num_variants, user_input)
+ANSWER_FORMATTERS = {
+    TaskType.SHORT_ANSWER: _format_short_answer,
+    TaskType.MULTIPLE_CHOICE: _format_multiple_choice,
+    TaskType.MATCHING: _format_matching,
+}
+
+
+def _format_answer(task_type: TaskType, num_variants: int, user_input: Any) -> str:
+    """Отформатировать ответ по типу задания (без кэширования)"""
+    formatter = ANSWER_FORMATTERS.get(task_type)
+    if formatter is None:
+        return str(user_input)
+    return formatter(num_variants, user_input)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_frozen_answer(task_type: TaskType, num_variants: int,
+                          kind: type, frozen: Any) -> str:
+    """Кэшируемый вариант _format_answer для ввода, приведённого к хешируемому виду"""
+    if kind is dict:
+        user_input = dict(frozen)
+    elif kind is list:
+        user_input = list(frozen)
+    else:
+        user_input = frozen
+    return _format_answer(task_type, num_variants, user_input)
+
+
+def _freeze_answer(user_input: Any):
+    """
+    Привести ввод к хешируемому ключу кэша или вернуть None, если ввод не кэшируется
+    Кэшируются только строки, целые числа и их списки/кортежи/словари:
+    для них равные ключи гарантированно дают одинаковый ответ
+    """
+    kind = type(user_input)
+    if kind is str or kind is int:
+        return user_input
+    if kind is list or kind is tuple:
+        if all(type(x) is str or type(x) is int for x in user_input):
+            return tuple(user_input)
+    elif kind is dict:
+        items = tuple(user_input.items())
+        if all((type(k) is str or type(k) is int) and (type(v) is str or type(v) is int)
+               for k, v in items):
+            return items
+    return None
+
+
+def format_answer(task_type: TaskType, num_variants: int, user_input: Any) -> str:
+    """
+    Отформатировать ответ пользователя в строку для сервера
+    Результаты кэшируются по (тип задания, число вариантов, ввод)
+    
+    Args:
+        task_type: Тип задания
+        num_variants: Число вариантов ответа (нужно только для множественного выбора)
+        user_input: Ввод пользователя
+    
+    Returns:
+        Отформатированная строка ответа
+    """
+    if task_type is not TaskType.MULTIPLE_CHOICE:
+        num_variants = 0  # Для остальных типов не влияет на результат
+    
+    frozen = _freeze_answer(user_input)
+    if frozen is None:
+        return _format_answer(task_type, num_variants, user_input)
+    return _format_frozen_answer(task_type, num_variants, type(user_input), frozen)
 
 
 class FIPIChecker:
     """Проверка решений заданий ФИПИ"""
     
-    def __init__(self, subject_key: str):
+    def __init__(self, subject_key: str, session: Optional[requests.Session] = None):
         """
         Инициализация checker'а
         
         Args:
             subject_key: Ключ предмета из SUBJECTS ('physics' или 'math_prof')
+            session: Готовая сессия из create_session() (например, общая с FIPIParser).
+                     Если не передана, создаётся новая
         """
-        if subject_key not in SUBJECTS:
-            raise ValueError(f"Неизвестный предмет: {subject_key}")
-        
-        self.subject_info = SUBJECTS[subject_key]
+        self.subject_info = get_subject(subject_key)
         self.project_id = self.subject_info['id']
         self.subject_name = self.subject_info['name_en']
         
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.session = session if session is not None else create_session()
+        
+        # Общий для хоста ограничитель частоты запросов
+        self.rate_limiter = get_rate_limiter(BASE_URL)
+        
+        # Неизменяемые части запроса на проверку кодируются один раз
+        self._solve_url = f"{BASE_URL}{SOLVE_ENDPOINT}"
+        self._body_tail = f"&ajax=1&proj={quote_plus(self.project_id)}".encode('ascii')
     
     def format_answer_for_check(self, task: Task, user_input: Any) -> str:
         """
@@ -52,47 +215,13 @@ class FIPIChecker:
             - Множественный выбор: user_input=[0, 2] -> return "10100" (выбраны 1-й и 3-й)
             - Соответствие: user_input={"А": "2", "Б": "4"} -> return "24"
         """
-        if task.task_type == TaskType.SHORT_ANSWER:
-            # Краткий ответ - просто строка
-            return str(user_input).strip()
-        
-        elif task.task_type == TaskType.MULTIPLE_CHOICE:
-            # Множественный выбор - бинарная строка
+        num_variants = 0
+        if task.task_type is TaskType.MULTIPLE_CHOICE:
             if not task.answer_variants:
                 raise ValueError("Нет вариантов ответа для задания")
-            
-            # user_input - список индексов выбранных вариантов
-            if isinstance(user_input, str):
-                # Если уже в формате бинарной строки
-                return user_input
-            
-            # Формируем бинарную строку
             num_variants = len(task.answer_variants)
-            answer_bits = ['0'] * num_variants
-            
-            for idx in user_input:
-                if 0 <= idx < num_variants:
-                    answer_bits[idx] = '1'
-            
-            return ''.join(answer_bits)
-        
-        elif task.task_type == TaskType.MATCHING:
-            # Установление соответствия - конкатенация выбранных значений
-            if isinstance(user_input, str):
-                # Если уже в формате строки
-                return user_input
-            
-            # user_input - словарь {буква: номер}
-            # Сортируем по буквам и склеиваем номера
-            if isinstance(user_input, dict):
-                sorted_letters = sorted(user_input.keys())
-                return ''.join(str(user_input[letter]) for letter in sorted_letters)
-            
-            # user_input - список номеров в порядке А, Б, ...
-            elif isinstance(user_input, (list, tuple)):
-                return ''.join(str(x) for x in user_input)
         
-        return str(user_input)
+        return format_answer(task.task_type, num_variants, user_input)
     
     def check_answer(self, task: Task, user_input: Any) -> CheckResponse:
         """
@@ -108,29 +237,24 @@ class FIPIChecker:
         # Форматирование ответа
         answer_str = self.format_answer_for_check(task, user_input)
         
-        # Подготовка данных для отправки
-        data = {
-            'guid': task.guid,
-            'answer': answer_str,
-            'ajax': '1',
-            'proj': self.project_id
-        }
-        
-        # Отправка запроса
-        url = f"{BASE_URL}{SOLVE_ENDPOINT}"
+        # Тело application/x-www-form-urlencoded: меняются только guid и answer
+        body = (
+            b"guid=" + quote_plus(task.guid).encode('ascii')
+            + b"&answer=" + quote_plus(answer_str).encode('ascii')
+            + self._body_tail
+        )
         
         try:
+            self.rate_limiter.acquire()  # Соблюдаем интервал между запросами
             response = self.session.post(
-                url,
-                data=data,
+                self._solve_url,
+                data=body,
+                headers=FORM_HEADERS,
                 timeout=REQUEST_TIMEOUT,
                 verify=False
             )
             response.raise_for_status()
             
-            # Задержка между запросами
-            time.sleep(REQUEST_DELAY)
-            
             # Обработка ответа
             result_code = response.text.strip()
             result = self._parse_result_code(result_code)
@@ -142,7 +266,7 @@ class FIPIChecker:
             )
         
         except requests.RequestException as e:
-            print(f"Ошибка при проверке ответа: {e}")
+            logger.error("Ошибка при проверке ответа: %s", e)
             return CheckResponse(
                 guid=task.guid,
                 result=CheckResult.ERROR,
@@ -159,16 +283,7 @@ class FIPIChecker:
         Returns:
             CheckResult
         """
-        result_str = RESULT_CODES.get(code, 'error')
-        
-        if result_str == 'correct':
-            return CheckResult.CORRECT
-        elif result_str == 'incorrect':
-            return CheckResult.INCORRECT
-        elif result_str == 'partially_correct':
-            return CheckResult.PARTIALLY_CORRECT
-        else:
-            return CheckResult.ERROR
+        return RESULT_CODE_MAP.get(code, CheckResult.ERROR)
     
     def batch_check(self, checks: list) -> list:
         """
@@ -183,86 +298,134 @@ class FIPIChecker:
         results = []
         
         for idx, (task, user_input) in enumerate(checks, 1):
-            print(f"[{idx}/{len(checks)}] Проверка задания {task.task_id}...")
+            logger.info("[%d/%d] Проверка задания %s...", idx, len(checks), task.task_id)
             result = self.check_answer(task, user_input)
             results.append(result)
             
-            print(f"  Результат: {result.result.value}")
+            logger.info("  Результат: %s", result.result.value)
         
         return results
-
-
-class AnswerHelper:
-    """Вспомогательные методы для работы с ответами"""
     
-    @staticmethod
-    def binary_string_to_indices(binary_str: str) -> list:
+    def check_answers(self, pairs: List[Tuple[Task, Any]],
+                      max_workers: int = CHECK_WORKERS) -> List[CheckResponse]:
         """
-        Преобразовать бинарную строку в список индексов
+        Проверить несколько заданий параллельно
         
-        Args:
-            binary_str: Строка типа "10100"
+        Запросы идут из пула потоков через общую сессию (её пул соединений
+        должен быть не меньше max_workers), частоту по-прежнему ограничивает
+        общий для хоста rate_limiter внутри check_answer
         
-        Returns:
-            [0, 2] - индексы выбранных вариантов
-        """
-        return [i for i, bit in enumerate(binary_str) if bit == '1']
-    
-    @staticmethod
-    def indices_to_binary_string(indices: list, total: int) -> str:
-        """
-        Преобразовать список индексов в бинарную строку
+        Пул не поднимает частоту запросов выше ограничителя: при настройках
+        по умолчанию (REQUEST_DELAY = 1, REQUEST_BURST = 1) уходит не больше
+        одного запроса в секунду, как и в batch_check. Выигрыш только в том,
+        что ожидание ответа одного запроса перекрывается с ожиданием
+        интервала для следующего. Заметно быстрее проверка становится лишь
+        при уменьшенном REQUEST_DELAY или увеличенном REQUEST_BURST
         
         Args:
-            indices: [0, 2]
-            total: Всего вариантов (например, 5)
+            pairs: Список кортежей (task, user_input)
+            max_workers: Максимум одновременных запросов
         
         Returns:
-            "10100"
+            Список CheckResponse в том же порядке, что и pairs
         """
-        bits = ['0'] * total
-        for idx in indices:
-            if 0 <= idx < total:
-                bits[idx] = '1'
-        return ''.join(bits)
-    
-    @staticmethod
-    def parse_matching_answer(answer_str: str) -> dict:
-        """
-        Преобразовать строку ответа соответствия в словарь
-        
-        Args:
-            answer_str: "24" (А-2, Б-4)
-        
-        Returns:
-            {"А": "2", "Б": "4"}
-        """
-        result = {}
-        letters = ['А', 'Б', 'В', 'Г', 'Д']
+        if not pairs:
+            return []
         
-        for idx, digit in enumerate(answer_str):
-            if idx < len(letters):
-                result[letters[idx]] = digit
-        
-        return result
+        workers = max(1, min(max_workers, len(pairs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda pair: self.check_answer(*pair), pairs))
+
+
+def binary_string_to_indices(binary_str: str) -> list:
+    """
+    Преобразовать бинарную строку в список индексов
     
-    @staticmethod
-    def format_matching_answer(mapping: dict) -> str:
-        """
-        Преобразовать словарь соответствия в строку
-        
-        Args:
-            mapping: {"А": "2", "Б": "4"}
-        
-        Returns:
-            "24"
-        """
-        sorted_letters = sorted(mapping.keys())
-        return ''.join(str(mapping[letter]) for letter in sorted_letters)
+    Args:
+        binary_str: Строка типа "10100"
+    
+    Returns:
+        [0, 2] - индексы выбранных вариантов
+    """
+    if not binary_str or binary_str.strip('01'):
+        # Пустая строка или посторонние символы - посимвольный разбор
+        return [i for i, bit in enumerate(binary_str) if bit == '1']
+    
+    # Перебираем только установленные биты: младший бит - последний символ
+    mask = int(binary_str, 2)
+    last = len(binary_str) - 1
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(last - (low_bit.bit_length() - 1))
+        mask ^= low_bit
+    indices.reverse()
+    return indices
+
+
+def indices_to_binary_string(indices: list, total: int) -> str:
+    """
+    Преобразовать список индексов в бинарную строку
+    
+    Args:
+        indices: [0, 2]
+        total: Всего вариантов (например, 5)
+    
+    Returns:
+        "10100"
+    """
+    return _format_multiple_choice_bits(indices, total)
+
+
+def parse_matching_answer(answer_str: str) -> dict:
+    """
+    Преобразовать строку ответа соответствия в словарь
+    
+    Args:
+        answer_str: "24" (А-2, Б-4)
+    
+    Returns:
+        {"А": "2", "Б": "4"}
+    """
+    result = {}
+    
+    for idx, digit in enumerate(answer_str):
+        if idx < len(MATCHING_ANSWER_LETTERS):
+            result[MATCHING_ANSWER_LETTERS[idx]] = digit
+    
+    return result
+
+
+def format_matching_answer(mapping: dict) -> str:
+    """
+    Преобразовать словарь соответствия в строку
+    
+    Args:
+        mapping: {"А": "2", "Б": "4"}
+    
+    Returns:
+        "24"
+    """
+    return _format_matching_dict(mapping)
+
+
+class AnswerHelper:
+    """
+    Вспомогательные методы для работы с ответами
+    Оставлен для обратной совместимости - внутри пакета вызываются
+    одноимённые функции модуля
+    """
+    
+    binary_string_to_indices = staticmethod(binary_string_to_indices)
+    indices_to_binary_string = staticmethod(indices_to_binary_string)
+    parse_matching_answer = staticmethod(parse_matching_answer)
+    format_matching_answer = staticmethod(format_matching_answer)
 
 
 # Пример использования
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     from parser import FIPIParser
     from utils import FileManager
     
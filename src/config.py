@@ -1,6 +1,8 @@
 """
 Конфигурация для работы с API ФИПИ
 """
+from types import MappingProxyType
+from typing import Mapping
 
 # Базовый URL
 BASE_URL = "https://ege.fipi.ru"
@@ -9,19 +11,32 @@ BASE_URL = "https://ege.fipi.ru"
 QUESTIONS_ENDPOINT = "/bank/questions.php"
 SOLVE_ENDPOINT = "/bank/solve.php"
 
-# ID предметов
-SUBJECTS = {
-    "physics": {
+# ID предметов (только для чтения)
+SUBJECTS = MappingProxyType({
+    "physics": MappingProxyType({
         "id": "BA1F39653304A5B041B656915DC36B38",
         "name": "Физика",
         "name_en": "physics"
-    },
-    "math_prof": {
+    }),
+    "math_prof": MappingProxyType({
         "id": "AC437B34557F88EA4115D2F374B0A07B",
         "name": "Математика (профиль)",
         "name_en": "math_prof"
-    }
-}
+    })
+})
+
+
+def get_subject(subject_key: str) -> Mapping[str, str]:
+    """
+    Получить описание предмета по ключу
+    
+    Raises:
+        ValueError: если предмет неизвестен
+    """
+    try:
+        return SUBJECTS[subject_key]
+    except KeyError:
+        raise ValueError(f"Неизвестный предмет: {subject_key}") from None
 
 # Типы заданий
 TASK_TYPES = {
@@ -38,22 +53,46 @@ RESULT_CODES = {
     "0": "error"              # Ошибка
 }
 
+# Буквы левого столбца задания на соответствие (А, Б, В, ...)
+MATCHING_LETTERS = tuple(chr(code) for code in range(ord('А'), ord('Я') + 1))
+
 # Настройки пагинации
 DEFAULT_PAGE_SIZE = 10
+PAGE_FETCH_WORKERS = 4  # Сколько страниц скачивать одновременно
 
 # Директория для хранения данных
 DATA_DIR = "data"
 
+# Размер блока при потоковой записи изображений на диск (байт)
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Сколько изображений одного задания скачивать одновременно
+IMAGE_DOWNLOAD_WORKERS = 8
+
+# Сколько заданий одной страницы сохранять одновременно (картинки + файлы)
+SAVE_WORKERS = 4
+
+# Сколько ответов проверять одновременно в FIPIChecker.check_answers
+CHECK_WORKERS = 8
+
 # Таймауты и задержки (в секундах)
 REQUEST_TIMEOUT = 30
-REQUEST_DELAY = 1.0  # Задержка между запросами
+REQUEST_DELAY = 1.0  # Минимальный интервал между запросами к одному хосту
+REQUEST_BURST = 1    # Сколько запросов можно сделать подряд без ожидания
+
+# Пул соединений и повторы запросов
+POOL_CONNECTIONS = 4    # Количество пулов (по одному на хост)
+POOL_MAXSIZE = 64       # Максимум соединений в пуле одного хоста
+MAX_RETRIES = 5         # Повторы при сетевых ошибках и ответах 5xx
+RETRY_BACKOFF = 0.5     # Множитель экспоненциальной задержки между повторами
 
 # Заголовки для запросов
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
     "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-    "Accept-Encoding": "gzip, deflate, br",
+    # br не указываем: без пакета brotli requests не распакует такой ответ
+    "Accept-Encoding": "gzip, deflate",
     "Connection": "keep-alive",
     "Upgrade-Insecure-Requests": "1"
 }
@@ -1,10 +1,24 @@
 """
 Модели данных для заданий ФИПИ
 """
-from dataclasses import dataclass, field, asdict
-from typing import List, Optional, Dict, Any
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, BinaryIO, Iterable
 from enum import Enum
+import io
 import json
+import sys
+
+# Быстрая сериализация orjson, если установлен
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Ключи metadata задаёт пользователь и они могут быть не строками:
+# как и стандартный json, orjson с OPT_NON_STR_KEYS приводит их к строкам
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    ORJSON_INDENT_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
 
 
 class TaskType(Enum):
@@ -22,30 +36,46 @@ class CheckResult(Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(slots=True)
 class AnswerVariant:
     """Вариант ответа для задания с выбором"""
     index: int
     text: str
     input_name: str  # Например: test0, test1
+    
+    def to_dict(self) -> dict:
+        return {'index': self.index, 'text': self.text, 'input_name': self.input_name}
 
 
-@dataclass
+@dataclass(slots=True)
 class MatchingOption:
     """Опция для задания на соответствие"""
     letter: str  # A, Б и т.д.
     text: str
     select_name: str  # ans0, ans1
+    
+    def to_dict(self) -> dict:
+        return {'letter': self.letter, 'text': self.text, 'select_name': self.select_name}
 
 
-@dataclass
+@dataclass(slots=True)
 class MatchingChoice:
     """Вариант выбора для соответствия"""
     number: str  # 1, 2, 3 и т.д.
     text: str
+    
+    def to_dict(self) -> dict:
+        return {'number': self.number, 'text': self.text}
+
 
+def _kes_primary(kes_codes: List[str]) -> Optional[str]:
+    """Код первого КЭС без описания (текст до первого пробела)"""
+    if not kes_codes:
+        return None
+    return sys.intern(kes_codes[0].partition(' ')[0])
 
-@dataclass
+
+@dataclass(slots=True)
 class Task:
     """Модель задания"""
     guid: str
@@ -74,83 +104,196 @@ class Task:
     # Метаданные
     metadata: Dict[str, Any] = field(default_factory=dict)
     
+    # Числовой код первого КЭС ("2.2" из "2.2 Иррациональные уравнения"),
+    # вычисляется из kes_codes при создании задания
+    kes_primary: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Предмет и коды КЭС повторяются у тысяч заданий - храним по одной копии строки
+        self.subject = sys.intern(self.subject)
+        self.kes_codes = [sys.intern(code) for code in self.kes_codes]
+        self.kes_primary = _kes_primary(self.kes_codes)
+    
     def to_dict(self) -> dict:
-        """Конвертация в словарь"""
-        data = asdict(self)
-        data['task_type'] = self.task_type.value
-        return data
+        """
+        Конвертация в словарь
+        Поля читаются напрямую, без dataclasses.asdict (он рекурсивно копирует
+        всё через deepcopy). Порядок ключей совпадает с порядком полей
+        
+        Каждый вызов возвращает новый словарь: его можно изменять, это не
+        затронет само задание. Результат не кэшируется, поэтому to_json/dump
+        всегда отражают текущие поля задания
+        """
+        return self._build_dict()
+    
+    def _build_dict(self) -> dict:
+        """Построить словарь полей задания"""
+        answer_variants = self.answer_variants
+        matching_options = self.matching_options
+        matching_choices = self.matching_choices
+        
+        return {
+            'guid': self.guid,
+            'task_id': self.task_id,
+            'subject': self.subject,
+            'task_type': self.task_type.value,
+            'question_text': self.question_text,
+            'question_html': self.question_html,
+            'answer_variants': (
+                [v.to_dict() for v in answer_variants]
+                if answer_variants is not None else None
+            ),
+            'matching_options': (
+                [o.to_dict() for o in matching_options]
+                if matching_options is not None else None
+            ),
+            'matching_choices': (
+                [c.to_dict() for c in matching_choices]
+                if matching_choices is not None else None
+            ),
+            'answer_unit': self.answer_unit,
+            'images': list(self.images),
+            'kes_codes': list(self.kes_codes),
+            'metadata': dict(self.metadata)
+        }
     
     def to_json(self, indent: int = 2) -> str:
-        """Конвертация в JSON"""
+        """
+        Конвертация в JSON
+        orjson поддерживает только отступ в 2 пробела, поэтому для
+        других значений indent используется стандартный json
+        """
+        if orjson is not None and indent == 2:
+            return orjson.dumps(self.to_dict(), option=ORJSON_INDENT_OPTIONS).decode('utf-8')
         return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
     
+    def to_json_bytes(self) -> bytes:
+        """
+        Конвертация в JSON в виде UTF-8 байт (для записи в файл в режиме 'wb')
+        Результат совпадает с to_json().encode('utf-8'), но при наличии
+        orjson сериализация выполняется без промежуточной строки
+        """
+        if orjson is not None:
+            return orjson.dumps(self.to_dict(), option=ORJSON_INDENT_OPTIONS)
+        return self.to_json().encode('utf-8')
+    
+    def dump(self, fp: BinaryIO):
+        """Записать задание в JSON в файл, открытый в бинарном режиме"""
+        fp.write(self.to_json_bytes())
+    
     def to_markdown(self) -> str:
         """Конвертация в Markdown"""
-        lines = []
-        lines.append(f"# Задание {self.task_id}")
-        lines.append(f"\n**GUID:** `{self.guid}`")
-        lines.append(f"\n**Предмет:** {self.subject}")
-        lines.append(f"\n**Тип:** {self.task_type.value}")
+        out = io.StringIO()
+        write = out.write
+        
+        write(f"# Задание {self.task_id}\n"
+              f"\n**GUID:** `{self.guid}`\n"
+              f"\n**Предмет:** {self.subject}\n"
+              f"\n**Тип:** {self.task_type.value}")
         
         if self.kes_codes:
-            lines.append(f"\n**КЭС:** {', '.join(self.kes_codes)}")
+            write(f"\n\n**КЭС:** {', '.join(self.kes_codes)}")
         
-        lines.append("\n## Текст задания\n")
-        lines.append(self.question_text)
+        write(f"\n\n## Текст задания\n\n{self.question_text}")
         
         if self.images:
-            lines.append("\n## Изображения\n")
+            write("\n\n## Изображения\n")
             for img in self.images:
-                lines.append(f"- `{img}`")
+                write(f"\n- `{img}`")
         
-        if self.task_type == TaskType.MULTIPLE_CHOICE and self.answer_variants:
-            lines.append("\n## Варианты ответа\n")
+        if self.task_type is TaskType.MULTIPLE_CHOICE and self.answer_variants:
+            write("\n\n## Варианты ответа\n")
             for var in self.answer_variants:
-                lines.append(f"{var.index + 1}. {var.text}")
+                write(f"\n{var.index + 1}. {var.text}")
         
-        elif self.task_type == TaskType.MATCHING:
+        elif self.task_type is TaskType.MATCHING:
             if self.matching_options:
-                lines.append("\n## Установите соответствие\n")
+                write("\n\n## Установите соответствие\n")
                 for opt in self.matching_options:
-                    lines.append(f"**{opt.letter})** {opt.text}")
+                    write(f"\n**{opt.letter})** {opt.text}")
                 
                 if self.matching_choices:
-                    lines.append("\n**Варианты:**\n")
+                    write("\n\n**Варианты:**\n")
                     for choice in self.matching_choices:
-                        lines.append(f"{choice.number}. {choice.text}")
+                        write(f"\n{choice.number}. {choice.text}")
         
-        elif self.task_type == TaskType.SHORT_ANSWER:
-            lines.append("\n## Формат ответа\n")
+        elif self.task_type is TaskType.SHORT_ANSWER:
+            write("\n\n## Формат ответа\n")
             unit = f" ({self.answer_unit})" if self.answer_unit else ""
-            lines.append(f"Краткий ответ{unit}")
+            write(f"\nКраткий ответ{unit}")
         
-        return "\n".join(lines)
+        return out.getvalue()
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Task':
-        """Создание из словаря"""
-        data = data.copy()
-        data['task_type'] = TaskType(data['task_type'])
-        
-        if data.get('answer_variants'):
-            data['answer_variants'] = [
-                AnswerVariant(**v) for v in data['answer_variants']
+        """Создание из словаря (входной словарь не изменяется и не копируется)"""
+        # Вложенные записи строятся позиционно, без распаковки **kwargs
+        answer_variants = data.get('answer_variants')
+        if answer_variants:
+            answer_variants = [
+                AnswerVariant(v['index'], v['text'], v['input_name'])
+                for v in answer_variants
             ]
         
-        if data.get('matching_options'):
-            data['matching_options'] = [
-                MatchingOption(**o) for o in data['matching_options']
+        matching_options = data.get('matching_options')
+        if matching_options:
+            matching_options = [
+                MatchingOption(o['letter'], o['text'], o['select_name'])
+                for o in matching_options
             ]
         
-        if data.get('matching_choices'):
-            data['matching_choices'] = [
-                MatchingChoice(**c) for c in data['matching_choices']
+        matching_choices = data.get('matching_choices')
+        if matching_choices:
+            matching_choices = [
+                MatchingChoice(c['number'], c['text'])
+                for c in matching_choices
             ]
         
-        return cls(**data)
+        # Конструктор и __post_init__ обходятся: все слоты (включая kes_primary)
+        # заполняются напрямую, строки интернируются так же, как в __post_init__
+        task = object.__new__(cls)
+        task.guid = data['guid']
+        task.task_id = data['task_id']
+        task.subject = sys.intern(data['subject'])
+        task.task_type = TaskType(data['task_type'])
+        task.question_text = data['question_text']
+        task.question_html = data['question_html']
+        task.answer_variants = answer_variants
+        task.matching_options = matching_options
+        task.matching_choices = matching_choices
+        task.answer_unit = data.get('answer_unit')
+        task.images = data.get('images', [])
+        task.kes_codes = [sys.intern(code) for code in data.get('kes_codes', ())]
+        task.kes_primary = _kes_primary(task.kes_codes)
+        task.metadata = data.get('metadata', {})
+        return task
+
+
+def dump_many(tasks: Iterable[Task], fp: BinaryIO) -> int:
+    """
+    Записать задания в формате NDJSON (одно задание в строке)
+    Файл можно читать построчно, не загружая весь корпус в память
+    
+    Args:
+        tasks: Задания для записи
+        fp: Файл, открытый в бинарном режиме
+    
+    Returns:
+        Количество записанных заданий
+    """
+    count = 0
+    for task in tasks:
+        if orjson is not None:
+            fp.write(orjson.dumps(task.to_dict(), option=ORJSON_OPTIONS))
+        else:
+            fp.write(json.dumps(task.to_dict(), ensure_ascii=False,
+                                separators=(',', ':')).encode('utf-8'))
+        fp.write(b'\n')
+        count += 1
+    return count
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CheckResponse:
     """Результат проверки задания"""
     guid: str
@@ -163,4 +306,11 @@ class CheckResponse:
             'result': self.result.value,
             'user_answer': self.user_answer
         }
+    
+    def to_json_bytes(self) -> bytes:
+        """Конвертация в JSON в виде UTF-8 байт (через orjson, если установлен)"""
+        if orjson is not None:
+            return orjson.dumps(self.to_dict(), option=ORJSON_OPTIONS)
+        return json.dumps(self.to_dict(), ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
 
@@ -1,45 +1,124 @@
 """
 Парсер заданий с сайта ФИПИ
 """
+import logging
 import re
-import time
-from typing import List, Optional, Dict
-from bs4 import BeautifulSoup
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import Iterable, Iterator, List, Optional, Dict, Tuple, Union
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
+from bs4.builder import builder_registry
 import requests
 import urllib3
 
 # Отключение предупреждений о SSL (для обхода проблем с сертификатом ФИПИ)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Быстрый C-парсер lxml, если установлен
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Построитель дерева BeautifulSoup создаётся один раз на поток и переиспользуется
+# между страницами (сам построитель не потокобезопасен)
+_builder_local = threading.local()
+
+
+def _get_tree_builder():
+    """Построитель дерева HTML_PARSER для текущего потока"""
+    builder = getattr(_builder_local, 'builder', None)
+    if builder is None:
+        builder = builder_registry.lookup(HTML_PARSER)()
+        _builder_local.builder = builder
+    return builder
+
+# Из страницы нужны только блоки заданий (id="q...") и блоки
+# с информацией о них (id="i..."), остальной HTML не разбираем
+PAGE_STRAINER = SoupStrainer('div', id=re.compile(r'^[qi]'))
+INFO_BLOCK_ID_RE = re.compile(r'^i')
+
+# Таблица параметров задания в блоке с информацией
+KES_TABLE_SELECTOR = 'div.task-info-panel table'
+KES_PARAM_NAME = 'кэс'  # Название параметра с КЭС (сравнивается без учёта регистра)
+
+# Вызов setQCount(863, 1, 10) с общим количеством заданий
+# Ищется в байтах ответа; число должно быть завершено, чтобы не взять
+# его начало на границе двух блоков
+QCOUNT_RE = re.compile(rb'setQCount\s*\(\s*(\d+)\s*[,)]')
+
+# Размер блока при потоковом поиске setQCount и сколько байт конца
+# предыдущего блока добавлять к следующему
+QCOUNT_CHUNK_SIZE = 8192
+QCOUNT_OVERLAP = 64
+
+# Единица измерения сразу после поля краткого ответа
+ANSWER_UNIT_RE = re.compile(r'^\s*([а-яА-Яa-zA-Z°]+)')
+
+# Номер варианта в задании на соответствие: "1)", "2)", ...
+CHOICE_NUMBER_RE = re.compile(r'^(\d+)\)')
+
 from .config import (
-    BASE_URL, QUESTIONS_ENDPOINT, SUBJECTS, 
-    DEFAULT_PAGE_SIZE, REQUEST_TIMEOUT, REQUEST_DELAY, HEADERS
+    BASE_URL, QUESTIONS_ENDPOINT, get_subject,
+    DEFAULT_PAGE_SIZE, REQUEST_TIMEOUT, PAGE_FETCH_WORKERS, SAVE_WORKERS,
+    IMAGE_DOWNLOAD_WORKERS
 )
 from .models import Task, TaskType, AnswerVariant, MatchingOption, MatchingChoice
-from .utils import FileManager, extract_image_urls_from_html, clean_text
+from .utils import FileManager, extract_image_urls_from_tag, clean_text
+from .session import create_session, get_rate_limiter, PageCache, get_declared_charset
+
+logger = logging.getLogger(__name__)
 
 
 class FIPIParser:
     """Парсер заданий ФИПИ"""
     
-    def __init__(self, subject_key: str):
+    def __init__(self, subject_key: str, session: Optional[requests.Session] = None,
+                 file_manager: Optional[FileManager] = None,
+                 cache_dir: Optional[str] = None):
         """
         Инициализация парсера
         
         Args:
             subject_key: Ключ предмета из SUBJECTS ('physics' или 'math_prof')
+            session: Готовая сессия из create_session() (например, общая с FIPIChecker).
+                     Если не передана, создаётся новая
+            file_manager: Общий FileManager (например, с StandaloneChecker).
+                          Если не передан, создаётся при первом обращении
+            cache_dir: Папка для кэша страниц (условные запросы по ETag /
+                       Last-Modified). По умолчанию кэш отключён
         """
-        if subject_key not in SUBJECTS:
-            raise ValueError(f"Неизвестный предмет: {subject_key}")
-        
-        self.subject_info = SUBJECTS[subject_key]
+        self.subject_info = get_subject(subject_key)
         self.project_id = self.subject_info['id']
         self.subject_name = self.subject_info['name_en']
         
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.session = session if session is not None else create_session()
+        
+        self._file_manager = file_manager
+        
+        self.page_cache = PageCache(cache_dir) if cache_dir else None
         
-        self.file_manager = FileManager()
+        # Общий для хоста ограничитель частоты запросов
+        self.rate_limiter = get_rate_limiter(BASE_URL)
+        
+        # id блока с информацией -> коды КЭС текущей страницы (таблица
+        # параметров разбирается один раз, кэш очищается в parse_page)
+        self._kes_cache: Dict[str, Tuple[str, ...]] = {}
+    
+    @property
+    def file_manager(self) -> FileManager:
+        """FileManager создаётся при первом обращении и затем переиспользуется"""
+        if self._file_manager is None:
+            self._file_manager = FileManager()
+        return self._file_manager
+    
+    @file_manager.setter
+    def file_manager(self, value: FileManager):
+        self._file_manager = value
     
     def get_questions_page(self, page: int = 0, page_size: int = DEFAULT_PAGE_SIZE) -> str:
         """
@@ -60,20 +139,61 @@ class FIPIParser:
         }
         
         try:
+            self.rate_limiter.acquire()  # Соблюдаем интервал между запросами
+            if self.page_cache is not None:
+                html = self.page_cache.get(self.session, url, params, REQUEST_TIMEOUT)
+            else:
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT, verify=False)
+                response.raise_for_status()
+                html = response.text
+            return html
+        except requests.RequestException as e:
+            logger.error("Ошибка при получении страницы %s: %s", page, e)
+            return ""
+    
+    def get_questions_page_bytes(self, page: int = 0,
+                                 page_size: int = DEFAULT_PAGE_SIZE) -> Tuple[bytes, Optional[str]]:
+        """
+        Получить страницу с заданиями без декодирования в строку
+        
+        Байты передаются в parse_page как есть: парсер декодирует их сам,
+        без промежуточной копии страницы в виде str
+        
+        Args:
+            page: Номер страницы (начиная с 0)
+            page_size: Количество заданий на странице
+        
+        Returns:
+            (тело страницы, кодировка из заголовка Content-Type или None);
+            (b"", None) при ошибке запроса
+        """
+        url = f"{BASE_URL}{QUESTIONS_ENDPOINT}"
+        params = {
+            'proj': self.project_id,
+            'page': page,
+            'pagesize': page_size
+        }
+        
+        try:
+            self.rate_limiter.acquire()  # Соблюдаем интервал между запросами
+            if self.page_cache is not None:
+                return self.page_cache.get_bytes(self.session, url, params, REQUEST_TIMEOUT)
             response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT, verify=False)
             response.raise_for_status()
-            time.sleep(REQUEST_DELAY)  # Задержка между запросами
-            return response.text
+            return response.content, get_declared_charset(response)
         except requests.RequestException as e:
-            print(f"Ошибка при получении страницы {page}: {e}")
-            return ""
+            logger.error("Ошибка при получении страницы %s: %s", page, e)
+            return b"", None
     
-    def parse_task_from_block(self, block: BeautifulSoup) -> Optional[Task]:
+    def parse_task_from_block(self, block: BeautifulSoup,
+                              info_blocks: Optional[Dict[str, BeautifulSoup]] = None) -> Optional[Task]:
         """
         Распарсить одно задание из блока div.qblock
         
         Args:
             block: BeautifulSoup объект блока задания
+            info_blocks: Индекс блоков с информацией {id: блок} для страницы
+                         (если не передан, блок ищется по всему документу)
         
         Returns:
             Объект Task или None если парсинг не удался
@@ -97,11 +217,11 @@ class FIPIParser:
             question_html = str(cell0)
             question_text = clean_text(cell0.get_text())
             
-            # Извлечение изображений
-            images = extract_image_urls_from_html(question_html)
+            # Извлечение изображений прямо из дерева, без повторного разбора HTML
+            images = extract_image_urls_from_tag(cell0)
             
             # Извлечение КЭС из task-info-panel
-            kes_codes = self._parse_kes_from_block(block)
+            kes_codes = self._parse_kes_from_block(block, info_blocks)
             
             # Определение типа задания и парсинг блока ответов
             variants_block = block.find('div', class_='varinats-block')
@@ -126,10 +246,11 @@ class FIPIParser:
             return task
         
         except Exception as e:
-            print(f"Ошибка при парсинге блока задания: {e}")
+            logger.exception("Ошибка при парсинге блока задания: %s", e)
             return None
     
-    def _parse_kes_from_block(self, block: BeautifulSoup) -> List[str]:
+    def _parse_kes_from_block(self, block: BeautifulSoup,
+                              info_blocks: Optional[Dict[str, BeautifulSoup]] = None) -> List[str]:
         """
         Извлечь коды КЭС из блока задания
         
@@ -139,6 +260,7 @@ class FIPIParser:
         
         Args:
             block: BeautifulSoup объект блока задания
+            info_blocks: Индекс блоков с информацией {id: блок} для страницы
         
         Returns:
             Список кодов КЭС (например, ["2.2 Иррациональные уравнения"])
@@ -158,25 +280,28 @@ class FIPIParser:
             # Ищем соответствующий div с информацией: id="i474F4B"
             info_block_id = f'i{task_id}'
             
-            # Получаем корневой soup для поиска
-            soup = block.find_parent() or block
-            while soup.parent:
-                soup = soup.parent
+            cached = self._kes_cache.get(info_block_id)
+            if cached is not None:
+                # Кэш хранит кортеж, вызывающему отдаётся новый список
+                return list(cached)
             
-            # Ищем блок с информацией по ID
-            info_block = soup.find('div', id=info_block_id)
+            if info_blocks is not None:
+                # Быстрый поиск по индексу, построенному в parse_page
+                info_block = info_blocks.get(info_block_id)
+            else:
+                # Получаем корневой soup для поиска
+                soup = block.find_parent() or block
+                while soup.parent:
+                    soup = soup.parent
+                
+                # Ищем блок с информацией по ID
+                info_block = soup.find('div', id=info_block_id)
             
             if not info_block:
                 return kes_codes
             
-            # Внутри ищем task-info-panel
-            info_panel = info_block.find('div', class_='task-info-panel')
-            
-            if not info_panel:
-                return kes_codes
-            
-            # Ищем таблицу с параметрами
-            info_table = info_panel.find('table')
+            # Таблица с параметрами внутри task-info-panel
+            info_table = info_block.select_one(KES_TABLE_SELECTOR)
             if not info_table:
                 return kes_codes
             
@@ -186,24 +311,31 @@ class FIPIParser:
                 cells = row.find_all('td')
                 if len(cells) >= 2:
                     param_name = cells[0].get_text(strip=True)
-                    if 'КЭС' in param_name or 'кэс' in param_name.lower():
+                    if KES_PARAM_NAME in param_name.casefold():
                         # Извлекаем значение КЭС
                         param_row = cells[1]
                         # Может быть несколько div'ов с разными КЭС
                         kes_divs = param_row.find_all('div')
                         if kes_divs:
+                            # Повторяющиеся div с тем же КЭС сохраняем один раз
+                            seen = set()
                             for kes_div in kes_divs:
                                 kes_text = clean_text(kes_div.get_text())
-                                if kes_text:
+                                if kes_text and kes_text not in seen:
+                                    seen.add(kes_text)
                                     kes_codes.append(kes_text)
                         else:
                             # Если нет div, берём весь текст
                             kes_text = clean_text(param_row.get_text())
                             if kes_text:
                                 kes_codes.append(kes_text)
+                        # Строка с КЭС в таблице одна
+                        break
+            
+            self._kes_cache[info_block_id] = tuple(kes_codes)
         
         except Exception as e:
-            print(f"  Ошибка при парсинге КЭС: {e}")
+            logger.exception("Ошибка при парсинге КЭС: %s", e)
         
         return kes_codes
     
@@ -214,24 +346,46 @@ class FIPIParser:
         Returns:
             (TaskType, dict с данными для конструктора Task)
         """
+        # Элементы ответа собираются за один обход блока, а тип определяется
+        # в прежнем порядке приоритета: поле ответа, checkbox, select
+        text_input = None
+        has_checkboxes = False
+        selects = []
+        for control in block.find_all(('input', 'select')):
+            if control.name == 'select':
+                selects.append(control)
+                continue
+            
+            input_type = control.get('type')
+            if input_type == 'text' and control.get('name') == 'answer':
+                text_input = control
+                break
+            if input_type == 'checkbox':
+                has_checkboxes = True
+        
         # Проверка на краткий ответ
-        text_input = block.find('input', {'type': 'text', 'name': 'answer'})
         if text_input:
             # Попытка найти единицу измерения
             answer_unit = None
-            parent = text_input.parent
-            if parent:
-                text_after = parent.get_text()
-                # Ищем текст после поля ввода
-                match = re.search(r'</input>\s*([а-яА-Яa-zA-Z°]+)', str(parent))
-                if match:
-                    answer_unit = match.group(1).strip()
+            
+            # Ищем первый непустой текст после поля ввода среди соседних узлов,
+            # не сериализуя родителя обратно в HTML
+            for sibling in text_input.next_siblings:
+                if isinstance(sibling, NavigableString):
+                    text_after = str(sibling)
+                else:
+                    text_after = sibling.get_text()
+                
+                if text_after.strip():
+                    match = ANSWER_UNIT_RE.match(text_after)
+                    if match:
+                        answer_unit = match.group(1)
+                    break
             
             return TaskType.SHORT_ANSWER, {'answer_unit': answer_unit}
         
         # Проверка на множественный выбор (checkbox)
-        checkboxes = block.find_all('input', {'type': 'checkbox'})
-        if checkboxes:
+        if has_checkboxes:
             variants = []
             active_rows = block.find_all('tr', class_='active-distractor')
             
@@ -244,7 +398,7 @@ class FIPIParser:
                 text_cell = row.find_all('td')[-1]
                 variant_text = clean_text(text_cell.get_text()) if text_cell else ""
                 
-                input_name = checkbox.get('name', f'test{idx}')
+                input_name = sys.intern(checkbox.get('name', f'test{idx}'))
                 
                 variants.append(AnswerVariant(
                     index=idx,
@@ -255,52 +409,48 @@ class FIPIParser:
             return TaskType.MULTIPLE_CHOICE, {'answer_variants': variants}
         
         # Проверка на установление соответствия (select)
-        selects = block.find_all('select')
         if selects:
             options = []
             choices = []
             
-            # Парсинг левого столбца (А, Б, ...)
-            answer_table = block.find('table', class_='answer-table')
-            if answer_table:
-                # Ищем все select'ы и соответствующие тексты
+            # Парсинг левого столбца (А, Б, ...) - только при наличии таблицы ответа.
+            # select уже собраны при определении типа, а find_parent идёт вверх
+            # по дереву, поэтому повторного обхода блока здесь нет
+            if block.find('table', class_='answer-table') is not None:
                 for idx, select in enumerate(selects):
-                    select_name = select.get('name', f'ans{idx}')
-                    
-                    # Попытка найти букву и текст
                     parent_td = select.find_parent('td')
-                    if parent_td:
-                        # Ищем предыдущий td с буквой
-                        prev_td = parent_td.find_previous_sibling('td')
-                        if prev_td:
-                            letter = clean_text(prev_td.get_text())
-                        else:
-                            letter = chr(ord('А') + idx)
-                        
-                        # Ищем текст описания (обычно выше в таблице)
-                        # Это упрощённая логика - может потребоваться уточнение
-                        text = f"Вариант {letter}"
-                        
-                        options.append(MatchingOption(
-                            letter=letter,
-                            text=text,
-                            select_name=select_name
-                        ))
-            
-            # Парсинг правого столбца (1, 2, 3, ...)
-            # Обычно варианты для выбора находятся в отдельной таблице
-            choice_rows = block.find_all('tr')
-            for row in choice_rows:
+                    if not parent_td:
+                        continue
+                    
+                    select_name = sys.intern(select.get('name', f'ans{idx}'))
+                    
+                    # Ищем предыдущий td с буквой
+                    prev_td = parent_td.find_previous_sibling('td')
+                    if prev_td:
+                        letter = clean_text(prev_td.get_text())
+                    else:
+                        letter = chr(ord('А') + idx)
+                    
+                    # Ищем текст описания (обычно выше в таблице)
+                    # Это упрощённая логика - может потребоваться уточнение
+                    text = f"Вариант {letter}"
+                    
+                    options.append(MatchingOption(
+                        letter=letter,
+                        text=text,
+                        select_name=select_name
+                    ))
+            
+            # Парсинг правого столбца (1, 2, 3, ...): строки вида "1) текст"
+            for row in block.find_all('tr'):
                 cells = row.find_all('td')
+                
                 if len(cells) >= 2:
                     # Первая ячейка - номер, вторая - текст
-                    number_cell = cells[0]
-                    text_cell = cells[1]
-                    
-                    number_text = clean_text(number_cell.get_text())
-                    if re.match(r'^\d+\)', number_text):
-                        number = number_text.replace(')', '').strip()
-                        choice_text = clean_text(text_cell.get_text())
+                    number_match = CHOICE_NUMBER_RE.match(clean_text(cells[0].get_text()))
+                    if number_match:
+                        number = number_match.group(1)
+                        choice_text = clean_text(cells[1].get_text())
                         
                         choices.append(MatchingChoice(
                             number=number,
@@ -315,22 +465,40 @@ class FIPIParser:
         # По умолчанию - краткий ответ
         return TaskType.SHORT_ANSWER, {}
     
-    def parse_page(self, html: str) -> List[Task]:
+    def parse_page(self, html: Union[str, bytes],
+                   from_encoding: Optional[str] = None) -> List[Task]:
         """
         Распарсить все задания со страницы
         
         Args:
-            html: HTML контент страницы
+            html: HTML контент страницы (строка или байты ответа)
+            from_encoding: Кодировка байтов, если известна - тогда BeautifulSoup
+                           не определяет её сам. Для строки не используется
         
         Returns:
             Список объектов Task
         """
-        soup = BeautifulSoup(html, 'html.parser')
+        builder = _get_tree_builder()
+        if isinstance(html, bytes) and from_encoding:
+            soup = BeautifulSoup(html, builder=builder, parse_only=PAGE_STRAINER,
+                                 from_encoding=from_encoding)
+        else:
+            soup = BeautifulSoup(html, builder=builder, parse_only=PAGE_STRAINER)
         task_blocks = soup.find_all('div', class_='qblock')
         
+        # Кэш КЭС нужен только в пределах страницы: при обходе всех страниц
+        # он не должен накапливать коды уже разобранных заданий
+        self._kes_cache.clear()
+        
+        # Индекс блоков с информацией (id="i...") строим один раз на страницу,
+        # чтобы не обходить весь документ для каждого задания
+        info_blocks = {
+            div['id']: div for div in soup.find_all('div', id=INFO_BLOCK_ID_RE)
+        }
+        
         tasks = []
         for block in task_blocks:
-            task = self.parse_task_from_block(block)
+            task = self.parse_task_from_block(block, info_blocks)
             if task:
                 tasks.append(task)
         
@@ -349,40 +517,90 @@ class FIPIParser:
         Returns:
             Список сохранённых заданий
         """
-        print(f"Получение страницы {page} ({self.subject_info['name']})...")
-        html = self.get_questions_page(page, page_size)
+        logger.info("Получение страницы %s (%s)...", page, self.subject_info['name'])
+        html, encoding = self.get_questions_page_bytes(page, page_size)
+        
+        return self._save_page(html, download_images, encoding)
+    
+    def _save_page(self, html: Union[str, bytes], download_images: bool = True,
+                   from_encoding: Optional[str] = None) -> List[Task]:
+        """
+        Распарсить и сохранить задания из уже полученной страницы
         
+        Args:
+            html: HTML контент страницы (строка или байты ответа)
+            download_images: Скачивать ли изображения
+            from_encoding: Кодировка байтов, если известна
+        
+        Returns:
+            Список сохранённых заданий
+        """
         if not html:
-            print("Не удалось получить страницу")
+            logger.warning("Не удалось получить страницу")
             return []
         
-        print("Парсинг заданий...")
-        tasks = self.parse_page(html)
+        logger.info("Парсинг заданий...")
+        tasks = self.parse_page(html, from_encoding)
         
-        print(f"Найдено заданий: {len(tasks)}")
+        logger.info("Найдено заданий: %d", len(tasks))
         
-        saved_tasks = []
-        for idx, task in enumerate(tasks, 1):
-            print(f"[{idx}/{len(tasks)}] Сохранение {task.task_id}...")
-            
-            # Скачивание изображений
-            if download_images and task.images:
-                try:
-                    downloaded_paths = self.file_manager.download_images(task, self.session)
-                    if downloaded_paths:
-                        print(f"  Скачано изображений: {len(downloaded_paths)}")
-                except Exception as e:
-                    print(f"  Ошибка при скачивании изображений: {e}")
-            
-            # Сохранение задания (пути к изображениям будут обновлены на локальные)
+        if not tasks:
+            return []
+        
+        # Задания независимы: скачивание картинок и запись файлов
+        # одних заданий идут одновременно с другими, порядок результата сохраняется.
+        # FileManager берётся до запуска потоков: ленивое свойство без блокировки
+        # иначе могло бы создать в потоках несколько экземпляров со своими кэшами
+        file_manager = self.file_manager
+        total = len(tasks)
+        workers = min(SAVE_WORKERS, total)
+        
+        # Общий лимит одновременных загрузок картинок делится между заданиями,
+        # чтобы пул заданий не умножал число соединений с хостом
+        image_workers = max(1, IMAGE_DOWNLOAD_WORKERS // workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                self._persist_task, tasks, range(1, total + 1),
+                repeat(total), repeat(download_images), repeat(file_manager),
+                repeat(image_workers)
+            )
+            return [task for task in results if task is not None]
+    
+    def _persist_task(self, task: Task, idx: int, total: int,
+                      download_images: bool = True,
+                      file_manager: Optional[FileManager] = None,
+                      image_workers: int = IMAGE_DOWNLOAD_WORKERS) -> Optional[Task]:
+        """
+        Скачать изображения задания и сохранить его на диск
+        
+        Args:
+            file_manager: FileManager для сохранения (по умолчанию self.file_manager)
+            image_workers: Максимум одновременных загрузок картинок этого задания
+        
+        Returns:
+            Задание, если оно сохранено, иначе None
+        """
+        logger.info("[%d/%d] Сохранение %s...", idx, total, task.task_id)
+        if file_manager is None:
+            file_manager = self.file_manager
+        
+        # Скачивание изображений
+        if download_images and task.images:
             try:
-                paths = self.file_manager.save_task(task, update_image_paths=True)
-                print(f"  Сохранено: {paths['directory']}")
-                saved_tasks.append(task)
+                downloaded_paths = file_manager.download_images(task, self.session, image_workers)
+                if downloaded_paths:
+                    logger.info("  %s: скачано изображений: %d", task.task_id, len(downloaded_paths))
             except Exception as e:
-                print(f"  Ошибка при сохранении: {e}")
+                logger.exception("Ошибка при скачивании изображений: %s", e)
         
-        return saved_tasks
+        # Сохранение задания (пути к изображениям будут обновлены на локальные)
+        try:
+            paths = file_manager.save_task(task, update_image_paths=True)
+            logger.info("  Сохранено: %s", paths['directory'])
+            return task
+        except Exception as e:
+            logger.exception("Ошибка при сохранении: %s", e)
+            return None
     
     def parse_multiple_pages(self, start_page: int = 0, num_pages: int = 5,
                             page_size: int = DEFAULT_PAGE_SIZE,
@@ -401,17 +619,66 @@ class FIPIParser:
         """
         all_tasks = []
         
-        for page in range(start_page, start_page + num_pages):
-            tasks = self.parse_and_save(page, page_size, download_images)
-            all_tasks.extend(tasks)
-            
-            if not tasks:
-                print(f"Страница {page} пуста, прекращаем парсинг")
-                break
+        # Страницы независимы, поэтому скачиваем их параллельно,
+        # а парсим и сохраняем последовательно в исходном порядке,
+        # начиная разбор каждой страницы сразу после её загрузки
+        pages = list(range(start_page, start_page + num_pages))
+        logger.info("Получение страниц %d-%d (%s)...",
+                    start_page, start_page + num_pages - 1, self.subject_info['name'])
         
-        print(f"\nВсего сохранено заданий: {len(all_tasks)}")
+        fetched_pages = self._iter_pages(pages, page_size)
+        try:
+            for page, (html, encoding) in zip(pages, fetched_pages):
+                logger.info("Страница %d", page)
+                tasks = self._save_page(html, download_images, encoding)
+                all_tasks.extend(tasks)
+                
+                if not tasks:
+                    logger.info("Страница %d пуста, прекращаем парсинг", page)
+                    break
+        finally:
+            fetched_pages.close()  # Отменяет загрузки, которые ещё не начались
+        
+        logger.info("Всего сохранено заданий: %d", len(all_tasks))
         return all_tasks
     
+    def _iter_pages(self, pages: Iterable[int],
+                    page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Tuple[bytes, Optional[str]]]:
+        """
+        Параллельно получать HTML нескольких страниц
+        
+        Одновременно загружается не больше PAGE_FETCH_WORKERS страниц: следующая
+        ставится в очередь, когда отдаётся очередная готовая. Страницы отдаются
+        по порядку, поэтому разбор первых идёт одновременно с загрузкой следующих,
+        а pages может быть и длинным диапазоном, перебор которого прервут раньше.
+        Если перебор прерван, ещё не начатые загрузки отменяются
+        
+        Args:
+            pages: Номера страниц
+            page_size: Размер страницы
+        
+        Yields:
+            (тело страницы, кодировка) в том же порядке, что и pages
+            (b"" для неудачных запросов)
+        """
+        page_iter = iter(pages)
+        executor = ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS)
+        try:
+            pending = deque(
+                executor.submit(self.get_questions_page_bytes, page, page_size)
+                for page in islice(page_iter, PAGE_FETCH_WORKERS)
+            )
+            while pending:
+                fetched = pending.popleft().result()
+                
+                next_page = next(page_iter, None)
+                if next_page is not None:
+                    pending.append(executor.submit(self.get_questions_page_bytes, next_page, page_size))
+                
+                yield fetched
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     def get_total_tasks_count(self) -> int:
         """
         Получить общее количество заданий для предмета
@@ -421,24 +688,34 @@ class FIPIParser:
         Returns:
             Количество заданий (0 если не удалось определить)
         """
+        url = f"{BASE_URL}{QUESTIONS_ENDPOINT}"
+        params = {
+            'proj': self.project_id,
+            'page': 0,
+            'pagesize': 1
+        }
+        
         try:
-            # Получаем первую страницу с заданиями
-            html = self.get_questions_page(0, 1)
+            self.rate_limiter.acquire()  # Соблюдаем интервал между запросами
             
-            if not html:
-                return 0
-            
-            # Ищем вызов функции setQCount в JavaScript коде
-            # Формат: setQCount(863, 1, 10) или setQCount(863)
-            import re
-            match = re.search(r'setQCount\s*\(\s*(\d+)', html)
-            if match:
-                return int(match.group(1))
+            # Страница читается потоком до первого вызова setQCount в JavaScript коде
+            # (формат: setQCount(863, 1, 10) или setQCount(863)), остальное не скачивается
+            with self.session.get(url, params=params, timeout=REQUEST_TIMEOUT,
+                                  stream=True, verify=False) as response:
+                response.raise_for_status()
+                
+                tail = b''
+                for chunk in response.iter_content(chunk_size=QCOUNT_CHUNK_SIZE):
+                    data = tail + chunk
+                    match = QCOUNT_RE.search(data)
+                    if match:
+                        return int(match.group(1))
+                    tail = data[-QCOUNT_OVERLAP:]
             
             return 0
         
         except Exception as e:
-            print(f"  Ошибка при получении количества заданий: {e}")
+            logger.exception("Ошибка при получении количества заданий: %s", e)
             return 0
     
     def parse_all_tasks(self, page_size: int = DEFAULT_PAGE_SIZE, 
@@ -488,46 +765,58 @@ class FIPIParser:
         print("\n" + "=" * 60)
         
         all_tasks = []
-        page = 0
         empty_pages = 0
         max_empty_pages = 3  # Остановка после 3 пустых страниц подряд
+        max_page = 1000      # Дополнительное ограничение на всякий случай
         
-        while True:
-            # Проверка лимита
-            if max_tasks and len(all_tasks) >= max_tasks:
-                print(f"\nДостигнут лимит заданий: {max_tasks}")
-                break
-            
-            # Прогресс
-            if max_tasks:
-                progress = min(100, (len(all_tasks) / max_tasks) * 100)
-                print(f"\n[Страница {page}] Прогресс: {len(all_tasks)}/{max_tasks} ({progress:.1f}%)")
-            elif total_count > 0:
-                progress = min(100, (len(all_tasks) / total_count) * 100)
-                print(f"\n[Страница {page}] Прогресс: {len(all_tasks)}/{total_count} ({progress:.1f}%)")
-            else:
-                print(f"\n[Страница {page}] Спарсено: {len(all_tasks)} заданий")
-            
-            # Парсинг страницы
-            tasks = self.parse_and_save(page, page_size, download_images)
-            
-            if tasks:
-                all_tasks.extend(tasks)
-                empty_pages = 0
-            else:
-                empty_pages += 1
-                print(f"Пустая страница ({empty_pages}/{max_empty_pages})")
+        # Следующие страницы загружаются заранее, пока текущая разбирается и сохраняется.
+        # Чтобы не тратить запросы (и интервалы ограничителя) на лишние страницы,
+        # диапазон ограничен страницами, которые могут понадобиться для max_tasks
+        # или для всех total_count заданий
+        task_limit = max_tasks or 0
+        if total_count > 0:
+            task_limit = min(task_limit, total_count) if task_limit else total_count
+        last_page = max_page
+        if task_limit:
+            last_page = min(max_page, (task_limit + page_size - 1) // page_size - 1)
+        
+        pages = self._iter_pages(range(last_page + 1), page_size)
+        try:
+            for page, (html, encoding) in enumerate(pages):
+                # Прогресс
+                if max_tasks:
+                    progress = min(100, (len(all_tasks) / max_tasks) * 100)
+                    logger.info("[Страница %d] Прогресс: %d/%d (%.1f%%)", page, len(all_tasks), max_tasks, progress)
+                elif total_count > 0:
+                    progress = min(100, (len(all_tasks) / total_count) * 100)
+                    logger.info("[Страница %d] Прогресс: %d/%d (%.1f%%)", page, len(all_tasks), total_count, progress)
+                else:
+                    logger.info("[Страница %d] Спарсено: %d заданий", page, len(all_tasks))
                 
-                if empty_pages >= max_empty_pages:
-                    print(f"\nПолучено {max_empty_pages} пустых страниц подряд. Парсинг завершён.")
+                # Парсинг страницы
+                tasks = self._save_page(html, download_images, encoding)
+                
+                if tasks:
+                    all_tasks.extend(tasks)
+                    empty_pages = 0
+                    
+                    # Проверка лимита до перехода к следующей странице
+                    if max_tasks and len(all_tasks) >= max_tasks:
+                        logger.info("Достигнут лимит заданий: %d", max_tasks)
+                        break
+                else:
+                    empty_pages += 1
+                    logger.info("Пустая страница (%d/%d)", empty_pages, max_empty_pages)
+                    
+                    if empty_pages >= max_empty_pages:
+                        logger.info("Получено %d пустых страниц подряд. Парсинг завершён.", max_empty_pages)
+                        break
+                
+                if page >= max_page:
+                    logger.warning("Достигнут лимит страниц (%d). Парсинг остановлен.", max_page)
                     break
-            
-            page += 1
-            
-            # Дополнительная проверка на всякий случай
-            if page > 1000:
-                print("\nДостигнут лимит страниц (1000). Парсинг остановлен.")
-                break
+        finally:
+            pages.close()  # Отменяет загрузки, которые ещё не начались
         
         print("\n" + "=" * 60)
         print(f"ПАРСИНГ ЗАВЕРШЁН")
@@ -553,13 +842,8 @@ class FIPIParser:
         for task_type, count in type_counts.items():
             print(f"  - {task_type}: {count}")
         
-        # Статистика по КЭС
-        kes_counts = Counter()
-        for task in tasks:
-            if task.kes_codes:
-                # Берём первый КЭС код
-                kes_code = task.kes_codes[0].split()[0] if ' ' in task.kes_codes[0] else task.kes_codes[0]
-                kes_counts[kes_code] += 1
+        # Статистика по КЭС (по коду первого КЭС)
+        kes_counts = Counter(task.kes_primary for task in tasks if task.kes_primary)
         
         if kes_counts:
             print(f"\nТоп-10 КЭС кодов:")
@@ -573,6 +857,8 @@ class FIPIParser:
 
 # Пример использования
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Парсинг физики
     physics_parser = FIPIParser('physics')
     physics_tasks = physics_parser.parse_and_save(page=0, page_size=5)
@@ -582,8 +868,7 @@ if __name__ == "__main__":
     # math_tasks = math_parser.parse_and_save(page=0, page_size=5)
     
     # Статистика
-    fm = FileManager()
-    stats = fm.get_statistics()
+    stats = physics_parser.file_manager.get_statistics()
     print("\nСтатистика:")
     print(f"Всего заданий: {stats['total_tasks']}")
     print(f"По предметам: {stats['by_subject']}")
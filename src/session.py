@@ -0,0 +1,287 @@
+"""
+HTTP-сессия для работы с сайтом ФИПИ
+"""
+import hashlib
+import json
+import re
+import ssl
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlencode, urlparse
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Отключение предупреждений о SSL (сессия работает с verify=False)
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+from .config import (
+    HEADERS, POOL_CONNECTIONS, POOL_MAXSIZE, MAX_RETRIES, RETRY_BACKOFF,
+    REQUEST_DELAY, REQUEST_BURST
+)
+from .utils import write_atomic
+
+
+# Кодировка в заголовке Content-Type: text/html; charset=windows-1251
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def get_declared_charset(response: requests.Response) -> Optional[str]:
+    """
+    Кодировка, явно указанная сервером в Content-Type
+    
+    В отличие от response.encoding, не подставляет ISO-8859-1 по умолчанию:
+    если сервер кодировку не указал, возвращается None
+    """
+    match = CHARSET_RE.search(response.headers.get('Content-Type', ''))
+    return match.group(1) if match else None
+
+
+def _create_ssl_context() -> ssl.SSLContext:
+    """SSLContext без проверки сертификата (CA-сертификаты не загружаются)"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class SharedSSLContextAdapter(HTTPAdapter):
+    """
+    HTTPAdapter, отдающий всем своим пулам соединений один SSLContext
+    
+    Без него urllib3 собирает новый SSLContext для каждого нового соединения.
+    Контекст у каждого адаптера свой: urllib3 выставляет в переданном контексте
+    verify_mode по параметрам запроса, поэтому общий на весь процесс контекст
+    один запрос с проверкой сертификата переключил бы для всех сессий
+    """
+    
+    def __init__(self, *args, **kwargs):
+        # Нужен до super().__init__, который вызывает init_poolmanager
+        self._ssl_context = _create_ssl_context()
+        super().__init__(*args, **kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('ssl_context', self._ssl_context)
+        super().init_poolmanager(*args, **kwargs)
+    
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault('ssl_context', self._ssl_context)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+def create_adapter(pool_maxsize: int = POOL_MAXSIZE) -> HTTPAdapter:
+    """
+    Создать HTTPAdapter с пулом соединений и повторами запросов
+    
+    Один адаптер можно подключить к нескольким сессиям: соединения
+    (TCP + TLS) будут общими, а cookies у каждой сессии останутся своими
+    
+    Args:
+        pool_maxsize: Максимум одновременных соединений с одним хостом
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST'])
+    )
+    return SharedSSLContextAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+
+
+def create_session(headers: Optional[Dict[str, str]] = None,
+                   pool_maxsize: int = POOL_MAXSIZE,
+                   adapter: Optional[HTTPAdapter] = None) -> requests.Session:
+    """
+    Создать сессию requests для запросов к ФИПИ
+
+    Одну и ту же сессию можно передать в FIPIParser, FIPIChecker и
+    StandaloneChecker, чтобы они использовали общий пул соединений
+
+    Args:
+        headers: Заголовки сессии (по умолчанию HEADERS из config)
+        pool_maxsize: Максимум одновременных соединений с одним хостом
+        adapter: Готовый адаптер из create_adapter() для общего пула соединений
+                 нескольких сессий (тогда pool_maxsize не используется)
+
+    Returns:
+        Настроенный requests.Session
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS if headers is None else headers)
+    
+    # У ФИПИ проблемы с сертификатом. session.verify - только значение
+    # по умолчанию: при заданных REQUESTS_CA_BUNDLE / CURL_CA_BUNDLE requests
+    # подменяет его путём к CA, поэтому запросы дополнительно передают verify=False
+    session.verify = False
+    
+    if adapter is None:
+        adapter = create_adapter(pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    
+    return session
+
+
+class PageCache:
+    """
+    Дисковый кэш страниц с условными GET-запросами
+    
+    Для каждой страницы хранится тело ответа и его ETag / Last-Modified.
+    При повторном запросе отправляются If-None-Match / If-Modified-Since,
+    и если сервер отвечает 304, тело берётся из кэша
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _paths(self, url: str, params: Dict[str, Any]) -> tuple:
+        """Пути к файлам метаданных и тела для запроса"""
+        key_source = f"{url}?{urlencode(sorted(params.items()))}"
+        key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+    
+    def get(self, session: requests.Session, url: str,
+            params: Dict[str, Any], timeout: float) -> str:
+        """
+        Выполнить GET с учётом кэша
+        
+        Returns:
+            Текст страницы (из сети или из кэша при ответе 304)
+        
+        Raises:
+            requests.RequestException: при ошибке запроса
+        """
+        response, meta, body_path = self._request(session, url, params, timeout)
+        if response is None:
+            return body_path.read_bytes().decode(meta.get('encoding') or 'utf-8', errors='replace')
+        return response.text
+    
+    def get_bytes(self, session: requests.Session, url: str,
+                  params: Dict[str, Any], timeout: float) -> Tuple[bytes, Optional[str]]:
+        """
+        Выполнить GET с учётом кэша, не декодируя тело
+        
+        Returns:
+            (тело страницы, кодировка из заголовка Content-Type или None)
+        
+        Raises:
+            requests.RequestException: при ошибке запроса
+        """
+        response, meta, body_path = self._request(session, url, params, timeout)
+        if response is None:
+            return body_path.read_bytes(), meta.get('charset')
+        return response.content, get_declared_charset(response)
+    
+    def _request(self, session: requests.Session, url: str,
+                 params: Dict[str, Any], timeout: float) -> tuple:
+        """
+        Условный GET и сохранение ответа в кэш
+        
+        Returns:
+            (ответ или None, если сервер ответил 304 и тело есть в кэше,
+             метаданные кэша, путь к файлу тела)
+        """
+        meta_path, body_path = self._paths(url, params)
+        
+        meta = {}
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+        
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        
+        response = session.get(url, params=params, headers=headers, timeout=timeout,
+                               verify=False)
+        
+        if response.status_code == 304 and body_path.exists():
+            return None, meta, body_path
+        
+        response.raise_for_status()
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            encoding = response.encoding or response.apparent_encoding
+            write_atomic(body_path, response.content)
+            write_atomic(meta_path, json.dumps({
+                'etag': etag,
+                'last_modified': last_modified,
+                'encoding': encoding,
+                'charset': get_declared_charset(response)
+            }).encode('utf-8'))
+        
+        return response, meta, body_path
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов (token bucket)
+    
+    Потокобезопасен: один экземпляр можно делить между потоками,
+    тогда общая частота запросов не превышает rate независимо от их числа
+    """
+    
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Допустимое число запросов в секунду (0 - без ограничений)
+            burst: Сколько запросов можно выполнить подряд без ожидания
+        """
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Дождаться разрешения на очередной запрос"""
+        if self.rate <= 0:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            
+            # Токен резервируется сразу, поэтому следующие вызовы
+            # встают в очередь за текущим
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        
+        if wait > 0:
+            time.sleep(wait)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url: str) -> RateLimiter:
+    """
+    Получить общий ограничитель частоты для хоста из url
+    
+    Парсер и checker'ы одного хоста используют один и тот же ограничитель,
+    частота задаётся REQUEST_DELAY и REQUEST_BURST из config
+    """
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            rate = 1.0 / REQUEST_DELAY if REQUEST_DELAY > 0 else 0
+            limiter = RateLimiter(rate, REQUEST_BURST)
+            _rate_limiters[host] = limiter
+        return limiter
@@ -4,12 +4,16 @@
 """
 import sys
 import io
+import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Sequence, Tuple
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 
 # Исправление кодировки для Windows
 if sys.platform == 'win32':
@@ -19,42 +23,96 @@ if sys.platform == 'win32':
 # Отключение предупреждений SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from .config import BASE_URL, SUBJECTS
-from .models import Task, TaskType, CheckResult
+from .config import BASE_URL, CHECK_WORKERS, get_subject
+from .models import Task, CheckResult
 from .utils import FileManager
+from .session import create_session, create_adapter, get_rate_limiter, RateLimiter
+from .checker import format_answer
+
+logger = logging.getLogger(__name__)
+
+# Граница multipart/form-data, как в запросах браузера
+MULTIPART_BOUNDARY = '---------------------------247746999627336697471839302941'
+
+# Шаблон тела запроса на проверку: меняются только guid, answer и proj
+MULTIPART_TEMPLATE = (
+    '--{b}\r\n'
+    'Content-Disposition: form-data; name="guid"\r\n\r\n%b\r\n'
+    '--{b}\r\n'
+    'Content-Disposition: form-data; name="answer"\r\n\r\n%b\r\n'
+    '--{b}\r\n'
+    'Content-Disposition: form-data; name="ajax"\r\n\r\n1\r\n'
+    '--{b}\r\n'
+    'Content-Disposition: form-data; name="proj"\r\n\r\n%b\r\n'
+    '--{b}--\r\n'
+).format(b=MULTIPART_BOUNDARY).encode('utf-8')
+
+
+# Код ответа solve.php -> результат проверки ('1' и '3' - верный ответ)
+RESULT_MAP = {
+    '1': 'correct',
+    '3': 'correct',  # Также правильный ответ
+    '2': 'incorrect',
+    '0': 'error'
+}
+
+# Заголовки сессии проверяющего (как у браузера, открывшего банк заданий)
+CHECKER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "Referer": f"{BASE_URL}/bank/index.php"
+}
 
 
 class CookieManager:
     """Менеджер для работы с cookies из файла"""
     
+    # Разобранные файлы cookies: (абсолютный путь, st_mtime_ns) -> cookies.
+    # Общий для всех экземпляров, поэтому новые проверяющие не разбирают
+    # неизменившийся файл заново
+    _cache: Dict[Tuple[str, int], Dict[str, str]] = {}
+    
     def __init__(self, cookie_file: str = "cookies.txt"):
         self.cookie_file = Path(cookie_file)
         self.cookies = {}
     
     def load_cookies(self) -> Dict[str, str]:
         """Загрузить cookies из файла"""
-        if not self.cookie_file.exists():
-            print(f"[!] Файл {self.cookie_file} не найден")
+        try:
+            mtime_ns = self.cookie_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("Файл %s не найден", self.cookie_file)
             return {}
         
+        # Относительный и абсолютный путь к одному файлу дают один ключ
+        cache_key = (str(self.cookie_file.resolve()), mtime_ns)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self.cookies = dict(cached)
+            return dict(cached)
+        
         cookies = {}
-        with open(self.cookie_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                # Пропускаем комментарии и пустые строки
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Формат: name=value
-                if '=' in line:
-                    name, value = line.split('=', 1)
-                    cookies[name.strip()] = value.strip()
+        data = self.cookie_file.read_text(encoding='utf-8')
+        for line in data.splitlines():
+            line = line.strip()
+            # Пропускаем комментарии и пустые строки
+            if not line or line[0] == '#':
+                continue
+            
+            # Формат: name=value
+            name, sep, value = line.partition('=')
+            if sep:
+                cookies[name.strip()] = value.strip()
         
         if cookies:
-            print(f"[OK] Загружено {len(cookies)} cookies из {self.cookie_file}")
+            logger.info("Загружено %d cookies из %s", len(cookies), self.cookie_file)
         else:
-            print(f"[!] Cookies не найдены в {self.cookie_file}")
+            logger.warning("Cookies не найдены в %s", self.cookie_file)
         
+        self._cache[cache_key] = dict(cookies)
         self.cookies = cookies
         return cookies
     
@@ -66,7 +124,7 @@ class CookieManager:
             for name, value in cookies.items():
                 f.write(f"{name}={value}\n")
         
-        print(f"[OK] Cookies сохранены в {self.cookie_file}")
+        logger.info("Cookies сохранены в %s", self.cookie_file)
 
 
 class StandaloneChecker:
@@ -75,27 +133,52 @@ class StandaloneChecker:
     Может работать как с локальными заданиями, так и напрямую через GUID
     """
     
-    def __init__(self, subject_key: str = 'physics', cookie_file: str = "cookies.txt"):
+    # Общий пул соединений всех экземпляров, созданных без своей сессии
+    _shared_adapter: Optional[HTTPAdapter] = None
+    _shared_adapter_lock = threading.Lock()
+    
+    @classmethod
+    def get_shared_adapter(cls) -> HTTPAdapter:
+        """
+        Общий HTTPAdapter проверяющих (создаётся при первом обращении)
+        
+        Соединения с ФИПИ (TCP + TLS) переиспользуются всеми экземплярами
+        StandaloneChecker, поэтому последовательные проверки не открывают
+        соединение заново. Сессия (и вместе с ней cookies) у каждого
+        экземпляра своя, поэтому разные файлы cookies не смешиваются
+        """
+        if cls._shared_adapter is None:
+            with cls._shared_adapter_lock:
+                if cls._shared_adapter is None:
+                    cls._shared_adapter = create_adapter()
+        return cls._shared_adapter
+    
+    def __init__(self, subject_key: str = 'physics', cookie_file: str = "cookies.txt",
+                 session: Optional[requests.Session] = None,
+                 file_manager: Optional[FileManager] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """
         Args:
             subject_key: Ключ предмета ('physics' или 'math_prof')
             cookie_file: Путь к файлу с cookies
+            session: Готовая сессия из create_session() для повторного использования соединений.
+                     Если не передана, создаётся своя сессия поверх общего
+                     пула соединений get_shared_adapter()
+            file_manager: Общий FileManager (например, с FIPIParser).
+                          Если не передан, создаётся при первом обращении
+            rate_limiter: Ограничитель частоты для check_by_guid (например,
+                          get_rate_limiter(BASE_URL), общий с FIPIChecker).
+                          По умолчанию одиночные проверки не ограничиваются
         """
-        if subject_key not in SUBJECTS:
-            raise ValueError(f"Неизвестный предмет: {subject_key}")
-        
-        self.subject_info = SUBJECTS[subject_key]
+        self.subject_info = get_subject(subject_key)
         self.project_id = self.subject_info['id']
         self.subject_name = self.subject_info['name_en']
         
         # Инициализация сессии
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-            "Referer": f"{BASE_URL}/bank/index.php"
-        })
+        if session is not None:
+            self.session = session
+        else:
+            self.session = create_session(CHECKER_HEADERS, adapter=self.get_shared_adapter())
         
         # Загрузка cookies
         self.cookie_manager = CookieManager(cookie_file)
@@ -104,7 +187,30 @@ class StandaloneChecker:
         if cookies:
             self.session.cookies.update(cookies)
         
-        self.file_manager = FileManager()
+        self._file_manager = file_manager
+        
+        # Ограничитель одиночных проверок включается явно: без него
+        # check_by_guid отправляет запрос сразу, как и раньше
+        self.rate_limiter = rate_limiter
+        
+        # Неизменяемые части запроса на проверку
+        self._solve_url = f"{BASE_URL}/bank/solve.php"
+        self._proj_bytes = self.project_id.encode('utf-8')
+        self._post_headers = {
+            'Content-Type': f'multipart/form-data; boundary={MULTIPART_BOUNDARY}',
+            'Referer': f'{BASE_URL}/bank/questions.php?proj={self.project_id}&init_filter_themes=1'
+        }
+    
+    @property
+    def file_manager(self) -> FileManager:
+        """FileManager создаётся при первом обращении и затем переиспользуется"""
+        if self._file_manager is None:
+            self._file_manager = FileManager()
+        return self._file_manager
+    
+    @file_manager.setter
+    def file_manager(self, value: FileManager):
+        self._file_manager = value
     
     def check_by_guid(self, guid: str, answer: str, task_type: str = "short_answer") -> Dict[str, Any]:
         """
@@ -118,47 +224,21 @@ class StandaloneChecker:
         Returns:
             Dict с результатом проверки
         """
-        url = f"{BASE_URL}/bank/solve.php"
-        
         try:
             # Используем multipart/form-data как в оригинале
-            boundary = '---------------------------247746999627336697471839302941'
-            
-            # Формируем тело запроса
-            body_parts = [
-                f'--{boundary}',
-                'Content-Disposition: form-data; name="guid"',
-                '',
-                guid,
-                f'--{boundary}',
-                'Content-Disposition: form-data; name="answer"',
-                '',
-                str(answer),
-                f'--{boundary}',
-                'Content-Disposition: form-data; name="ajax"',
-                '',
-                '1',
-                f'--{boundary}',
-                'Content-Disposition: form-data; name="proj"',
-                '',
-                self.project_id,
-                f'--{boundary}--',
-                ''
-            ]
-            
-            body = '\r\n'.join(body_parts)
-            
-            # Заголовки для POST запроса
-            headers = {
-                'Content-Type': f'multipart/form-data; boundary={boundary}',
-                'Referer': f'{BASE_URL}/bank/questions.php?proj={self.project_id}&init_filter_themes=1'
-            }
+            body = MULTIPART_TEMPLATE % (
+                guid.encode('utf-8'),
+                str(answer).encode('utf-8'),
+                self._proj_bytes
+            )
             
-            # Отправляем запрос
+            # Отправляем запрос (с ожиданием интервала, если задан ограничитель)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
             response = self.session.post(
-                url,
-                data=body.encode('utf-8'),
-                headers=headers,
+                self._solve_url,
+                data=body,
+                headers=self._post_headers,
                 timeout=30,
                 verify=False
             )
@@ -176,15 +256,7 @@ class StandaloneChecker:
             result_code = response.text.strip()
             
             # Преобразуем код в результат
-            # Коды: '1', '3' = correct, '2' = incorrect, '0' = error
-            result_map = {
-                '1': 'correct',
-                '3': 'correct',  # Также правильный ответ
-                '2': 'incorrect',
-                '0': 'error'
-            }
-            
-            result = result_map.get(result_code, 'error')
+            result = RESULT_MAP.get(result_code, 'error')
             
             return {
                 'guid': guid,
@@ -205,6 +277,44 @@ class StandaloneChecker:
                 'success': False
             }
     
+    def check_many(self, items: Sequence[tuple],
+                   max_workers: int = CHECK_WORKERS) -> List[Dict[str, Any]]:
+        """
+        Проверить несколько ответов по GUID параллельно
+        
+        Запросы идут из пула потоков через одну сессию (её пул соединений
+        должен быть не меньше max_workers). Частоту всегда ограничивает
+        rate_limiter экземпляра, а если он не задан - общий для хоста
+        ограничитель get_rate_limiter(BASE_URL)
+        
+        Поэтому пул не поднимает частоту выше ограничителя: при настройках
+        по умолчанию (REQUEST_DELAY = 1, REQUEST_BURST = 1) уходит не больше
+        одного запроса в секунду, как и при последовательных вызовах
+        check_by_guid с ограничителем. Выигрыш только в перекрытии ожидания
+        ответов
+        
+        Args:
+            items: Кортежи (guid, answer) или (guid, answer, task_type)
+            max_workers: Максимум одновременных запросов
+        
+        Returns:
+            Результаты check_by_guid в том же порядке, что и items
+        """
+        if not items:
+            return []
+        
+        # Если ограничитель задан, check_by_guid ждёт его сам
+        limiter = get_rate_limiter(BASE_URL) if self.rate_limiter is None else None
+        
+        def check(item):
+            if limiter is not None:
+                limiter.acquire()
+            return self.check_by_guid(*item)
+        
+        workers = max(1, min(max_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(check, items))
+    
     def check_task(self, task: Task, user_input: Any) -> Dict[str, Any]:
         """
         Проверить ответ для задания
@@ -240,11 +350,11 @@ class StandaloneChecker:
         task = self._find_local_task(task_id)
         
         if task:
-            print(f"[OK] Задание {task_id} найдено локально")
+            logger.info("Задание %s найдено локально", task_id)
             return self.check_task(task, user_input)
         else:
-            print(f"[!] Задание {task_id} не найдено локально")
-            print("[!] Для проверки без локального задания используйте GUID")
+            logger.warning("Задание %s не найдено локально. "
+                           "Для проверки без локального задания используйте GUID", task_id)
             return {
                 'task_id': task_id,
                 'result': 'error',
@@ -254,46 +364,16 @@ class StandaloneChecker:
     
     def _find_local_task(self, task_id: str) -> Optional[Task]:
         """Найти задание в локальной базе"""
-        task_dirs = self.file_manager.find_tasks_by_subject(self.subject_name)
-        
-        for task_dir in task_dirs:
-            task = self.file_manager.load_task(task_dir)
-            if task and task.task_id == task_id:
-                return task
-        
-        return None
+        task_dir = self.file_manager.find_task_dir_by_id(self.subject_name, task_id)
+        if task_dir is None:
+            return None
+        return self.file_manager.load_task(task_dir)
     
     def _format_answer(self, task: Task, user_input: Any) -> str:
         """Форматировать ответ пользователя"""
-        if task.task_type == TaskType.SHORT_ANSWER:
-            return str(user_input).strip()
-        
-        elif task.task_type == TaskType.MULTIPLE_CHOICE:
-            if isinstance(user_input, str):
-                return user_input
-            
-            # user_input - список индексов
-            num_variants = len(task.answer_variants) if task.answer_variants else 5
-            answer_bits = ['0'] * num_variants
-            
-            for idx in user_input:
-                if 0 <= idx < num_variants:
-                    answer_bits[idx] = '1'
-            
-            return ''.join(answer_bits)
-        
-        elif task.task_type == TaskType.MATCHING:
-            if isinstance(user_input, str):
-                return user_input
-            
-            if isinstance(user_input, dict):
-                sorted_letters = sorted(user_input.keys())
-                return ''.join(str(user_input[letter]) for letter in sorted_letters)
-            
-            elif isinstance(user_input, (list, tuple)):
-                return ''.join(str(x) for x in user_input)
-        
-        return str(user_input)
+        # Без известных вариантов считаем, что их 5
+        num_variants = len(task.answer_variants) if task.answer_variants else 5
+        return format_answer(task.task_type, num_variants, user_input)
     
     def test_connection(self) -> bool:
         """Проверить подключение к ФИПИ"""
@@ -306,14 +386,14 @@ class StandaloneChecker:
             )
             
             if response.status_code == 200:
-                print("[OK] Подключение к ФИПИ успешно")
+                logger.info("Подключение к ФИПИ успешно")
                 return True
             else:
-                print(f"[!] Ошибка подключения: HTTP {response.status_code}")
+                logger.warning("Ошибка подключения: HTTP %s", response.status_code)
                 return False
         
         except Exception as e:
-            print(f"[!] Ошибка подключения: {e}")
+            logger.warning("Ошибка подключения: %s", e)
             return False
 
 
@@ -351,6 +431,8 @@ def print_result(result: Dict[str, Any]):
 
 # Примеры использования
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     print("=" * 60)
     print("STANDALONE FIPI CHECKER")
     print("=" * 60)
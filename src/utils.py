@@ -1,14 +1,71 @@
 """
 Утилиты для работы с файлами и данными
 """
+import logging
 import os
 import json
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List
-import requests
+from typing import TYPE_CHECKING, Optional, List, Dict, Set, Tuple, Union
 from .models import Task
-from .config import DATA_DIR
+from .config import (
+    DATA_DIR, BASE_URL, IMAGE_CHUNK_SIZE, IMAGE_DOWNLOAD_WORKERS,
+    REQUEST_TIMEOUT, REQUEST_DELAY, REQUEST_BURST
+)
+
+# requests нужен только для аннотаций - сам модуль его не импортирует
+if TYPE_CHECKING:
+    import requests
+
+# Быстрый разбор JSON через orjson, если установлен
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+
+# Регулярные выражения компилируются один раз при импорте модуля
+SHOW_PICTURE_RE = re.compile(r"ShowPictureQ\(['\"]([^'\"]+)['\"]\)")
+
+# ShowPictureQ и src тегов img за один проход. src берётся заглядыванием вперёд,
+# не поглощая сам тег: ShowPictureQ внутри атрибутов img тоже будет найден
+IMAGE_URL_RE = re.compile(
+    SHOW_PICTURE_RE.pattern + r'|<img(?=[^>]+src=["\']([^"\']+)["\'])'
+)
+
+
+def write_atomic(path: Path, data: bytes):
+    """
+    Атомарно записать файл (через временный файл и os.replace)
+    Имя временного файла уникально для процесса и потока, поэтому один
+    и тот же файл можно записывать из нескольких потоков
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _absolute_image_url(img_url: str) -> str:
+    """Полный URL изображения (относительные пути дополняются BASE_URL)"""
+    if img_url.startswith('http'):
+        return img_url
+    # Добавляем слеш если его нет
+    if not img_url.startswith('/'):
+        img_url = '/' + img_url
+    return BASE_URL + img_url
 
 
 class FileManager:
@@ -16,27 +73,59 @@ class FileManager:
     
     def __init__(self, base_dir: str = DATA_DIR):
         self.base_dir = Path(base_dir)
+        
+        # Путь к папке КЭС -> (st_mtime_ns папки, количество заданий в ней)
+        self._kes_count_cache: Dict[str, Tuple[int, int]] = {}
+        
+        # Папки, уже созданные этим FileManager (чтобы не проверять их повторно)
+        self._known_dirs: Set[Path] = set()
+        
+        # Папка media -> номер следующего изображения без имени в URL
+        # (картинки скачиваются из нескольких потоков, поэтому под блокировкой)
+        self._image_counters: Dict[Path, int] = {}
+        self._image_counter_lock = threading.Lock()
+        
+        # Предмет -> (публичный номер задания -> папка задания),
+        # строится при первом поиске по номеру и дополняется в save_task
+        self._task_id_index: Dict[str, Dict[str, str]] = {}
+        # Предмет -> mtime папок предмета и КЭС на момент построения индекса
+        # (None - индекс неполный и при промахе строится заново)
+        self._task_id_index_mtimes: Dict[str, Optional[Tuple[Tuple[str, int], ...]]] = {}
+        
+        # (предмет, код КЭС, GUID) -> папка задания из get_task_directory
+        self._dir_cache: Dict[Tuple[str, Optional[str], str], Path] = {}
+    
+    def _ensure_dir(self, path: Path):
+        """Создать папку вместе с родителями, если она ещё не создавалась"""
+        if path not in self._known_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(path)
     
     def get_task_directory(self, task: Task) -> Path:
         """
         Получить директорию для сохранения задания
         Структура: data/{предмет}/{КЭС}/{GUID}/
         """
+        # Для одного задания путь запрашивается несколько раз
+        # (картинки, media, сохранение) - собираем его один раз
+        cache_key = (task.subject, task.kes_primary, task.guid)
+        task_dir = self._dir_cache.get(cache_key)
+        if task_dir is not None:
+            return task_dir
+        
         subject_dir = self.base_dir / task.subject
         
         # Если есть коды КЭС, создаём папки для них
-        if task.kes_codes:
-            # Берём первый КЭС код и извлекаем только код (например "2.2" из "2.2 Иррациональные уравнения")
-            kes_code = task.kes_codes[0]
-            # Извлекаем числовой код (до первого пробела)
-            kes_number = kes_code.split()[0] if ' ' in kes_code else kes_code
-            # Заменяем точки на подчёркивания для имени папки
-            kes_folder = kes_number.replace('.', '_')
+        if task.kes_primary:
+            # Код первого КЭС (например "2.2" из "2.2 Иррациональные уравнения"),
+            # точки заменяем на подчёркивания для имени папки
+            kes_folder = task.kes_primary.replace('.', '_')
             kes_dir = subject_dir / kes_folder
         else:
             kes_dir = subject_dir / "unknown_kes"
         
         task_dir = kes_dir / task.guid
+        self._dir_cache[cache_key] = task_dir
         return task_dir
     
     def save_task(self, task: Task, update_image_paths: bool = True) -> dict:
@@ -50,7 +139,25 @@ class FileManager:
         Возвращает пути к созданным файлам
         """
         task_dir = self.get_task_directory(task)
-        task_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Папка КЭС общая для многих заданий - создаём её один раз,
+        # для самого задания достаточно одного mkdir
+        self._ensure_dir(task_dir.parent)
+        try:
+            task_dir.mkdir()
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            # Папку КЭС удалили со стороны - создаём заново
+            self._known_dirs.discard(task_dir.parent)
+            task_dir.mkdir(parents=True, exist_ok=True)
+        
+        # task.json появится уже после создания папки и не изменит mtime папки КЭС
+        self._kes_count_cache.pop(str(task_dir.parent), None)
+        
+        task_id_index = self._task_id_index.get(task.subject)
+        if task_id_index is not None:
+            task_id_index[task.task_id] = str(task_dir)
         
         # Если нужно обновить пути к изображениям
         if update_image_paths and task.images:
@@ -65,7 +172,8 @@ class FileManager:
             if media_dir.exists():
                 # Находим все скачанные изображения
                 for img_file in media_dir.iterdir():
-                    if img_file.is_file():
+                    # .tmp - недокачанный файл прерванного запуска
+                    if img_file.is_file() and img_file.suffix != '.tmp':
                         # Относительный путь от директории задания
                         rel_path = f"media/{img_file.name}"
                         local_image_paths.append(rel_path)
@@ -74,15 +182,14 @@ class FileManager:
             if local_image_paths:
                 task.images = local_image_paths
         
-        # Сохранение JSON
+        # Сохранение JSON и Markdown: каждый файл пишется целиком одним вызовом
+        # во временный файл и подменяется атомарно, поэтому при сбое на диске
+        # не останется обрезанного task.json
         json_path = task_dir / "task.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            f.write(task.to_json())
+        write_atomic(json_path, task.to_json_bytes())
         
-        # Сохранение Markdown
         md_path = task_dir / "task.md"
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(task.to_markdown())
+        write_atomic(md_path, task.to_markdown().encode('utf-8'))
         
         return {
             'json': str(json_path),
@@ -90,85 +197,277 @@ class FileManager:
             'directory': str(task_dir)
         }
     
-    def load_task(self, task_dir: Path) -> Optional[Task]:
-        """Загрузить задание из директории"""
-        json_path = task_dir / "task.json"
+    def load_task(self, task_dir: Union[str, Path]) -> Optional[Task]:
+        """Загрузить задание из директории (путь строкой или Path)"""
+        json_path = os.path.join(task_dir, "task.json")
         
-        if not json_path.exists():
+        # Без отдельной проверки exists(): открытие само сообщит об отсутствии файла
+        try:
+            f = open(json_path, 'rb')
+        except FileNotFoundError:
             return None
         
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with f:
+            data = _json_loads(f.read())
         
         return Task.from_dict(data)
     
-    def save_image(self, task: Task, image_url: str, image_data: bytes) -> str:
+    def get_image_path(self, task: Task, image_url: str) -> Path:
         """
-        Сохранить изображение в директорию задания
-        Возвращает путь к сохранённому файлу
+        Получить путь для сохранения изображения (создаёт папку media)
         """
-        task_dir = self.get_task_directory(task)
-        media_dir = task_dir / "media"
-        media_dir.mkdir(parents=True, exist_ok=True)
-        
+        return self._media_file_path(self.get_media_directory(task), image_url)
+    
+    def get_media_directory(self, task: Task) -> Path:
+        """Получить (и создать) папку media задания"""
+        media_dir = self.get_task_directory(task) / "media"
+        self._ensure_dir(media_dir)
+        return media_dir
+    
+    def _media_file_path(self, media_dir: Path, image_url: str) -> Path:
+        """Путь к файлу изображения внутри папки media"""
         # Извлечь имя файла из URL
         filename = os.path.basename(image_url)
         if not filename:
-            filename = f"image_{len(os.listdir(media_dir))}.png"
+            filename = f"image_{self._next_image_number(media_dir)}.png"
         
-        image_path = media_dir / filename
+        return media_dir / filename
+    
+    def _next_image_number(self, media_dir: Path) -> int:
+        """
+        Номер для изображения без имени файла в URL
+        Папка читается только при первом обращении (чтобы не затереть
+        файлы прошлых запусков), дальше номер берётся из счётчика
+        """
+        with self._image_counter_lock:
+            number = self._image_counters.get(media_dir)
+            if number is None:
+                number = len(os.listdir(media_dir))
+            self._image_counters[media_dir] = number + 1
+            return number
+    
+    def save_image(self, task: Task, image_url: str, image_data: bytes) -> str:
+        """
+        Сохранить изображение в директорию задания
+        Возвращает путь к сохранённому файлу
+        """
+        image_path = self.get_image_path(task, image_url)
         with open(image_path, 'wb') as f:
             f.write(image_data)
         
         return str(image_path)
     
-    def download_images(self, task: Task, session: requests.Session) -> List[str]:
+    def download_images(self, task: Task, session: 'requests.Session',
+                        max_workers: int = IMAGE_DOWNLOAD_WORKERS) -> List[str]:
         """
         Скачать все изображения для задания
+        Изображения скачиваются через общий пул соединений сессии с тем же
+        ограничением частоты запросов к хосту, что и страницы (get_rate_limiter),
+        повторяющиеся файлы и уже скачанные файлы пропускаются
+        max_workers - максимум одновременных загрузок для этого задания
+        (если задания сохраняются параллельно, общий лимит делится между ними)
         Возвращает список путей к сохранённым файлам
         """
-        saved_paths = []
+        if not task.images:
+            return []
         
+        # Папка media одна на задание - вычисляем и создаём её один раз
+        media_dir = self.get_media_directory(task)
+        
+        # Дубликаты убираем по итоговому файлу, а не по строке URL:
+        # '../../docs/x.png' и 'docs/x.png' пишутся в один и тот же media/x.png,
+        # и два потока не должны писать его одновременно. Порядок сохраняется
+        targets: Dict[Path, str] = {}
         for img_url in task.images:
+            img_url = _absolute_image_url(img_url)
+            targets.setdefault(self._media_file_path(media_dir, img_url), img_url)
+        
+        workers = max(1, min(max_workers, len(targets)))
+        if REQUEST_DELAY > 0:
+            # Ограничитель хоста пропускает не больше REQUEST_BURST запросов подряд,
+            # остальные потоки только ждали бы своей очереди
+            workers = min(workers, REQUEST_BURST)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda target: self._download_image(target[0], target[1], session),
+                targets.items()
+            )
+            return [path for path in results if path]
+    
+    def _download_image(self, path: Path, img_url: str,
+                        session: 'requests.Session') -> Optional[str]:
+        """
+        Скачать одно изображение в path, записывая его на диск по частям
+        Файл пишется во временный и переносится на место только целиком,
+        поэтому непустой path - всегда полностью скачанное изображение
+        Возвращает путь к файлу или None при ошибке
+        """
+        tmp_path = None
+        try:
+            # Файл уже скачан ранее - повторно не загружаем
             try:
-                # Добавить базовый URL если нужно
-                if not img_url.startswith('http'):
-                    from config import BASE_URL
-                    # Добавляем слеш если его нет
-                    if not img_url.startswith('/'):
-                        img_url = '/' + img_url
-                    img_url = BASE_URL + img_url
-                
-                response = session.get(img_url, timeout=30, verify=False)
+                if path.stat().st_size > 0:
+                    return str(path)
+            except FileNotFoundError:
+                pass
+            
+            # Импорт здесь: сам модуль utils не зависит от requests
+            from .session import get_rate_limiter
+            get_rate_limiter(img_url).acquire()  # Соблюдаем интервал между запросами
+            
+            with session.get(img_url, timeout=REQUEST_TIMEOUT, stream=True,
+                             verify=False) as response:
                 response.raise_for_status()
                 
-                path = self.save_image(task, img_url, response.content)
-                saved_paths.append(path)
-            except Exception as e:
-                print(f"Ошибка при скачивании {img_url}: {e}")
-        
-        return saved_paths
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                        f.write(chunk)
+            
+            os.replace(tmp_path, path)
+            return str(path)
+        except Exception as e:
+            # Не оставляем на диске недокачанный файл
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+            logger.error("Ошибка при скачивании %s: %s", img_url, e)
+            return None
     
-    def find_tasks_by_subject(self, subject: str) -> List[Path]:
-        """Найти все задания по предмету"""
-        # Проверяем существование базовой директории
-        if not self.base_dir.exists():
-            return []
-        
-        subject_dir = self.base_dir / subject
+    def find_task_dirs(self, subject: str) -> List[str]:
+        """
+        Найти все задания по предмету
+        Возвращает пути к папкам заданий строками (без создания объектов Path)
+        """
+        subject_dir = os.path.join(self.base_dir, subject)
         
-        if not subject_dir.exists():
+        # os.scandir отдаёт тип записи из самого каталога, без stat() на каждую папку
+        task_dirs = []
+        try:
+            kes_entries = os.scandir(subject_dir)
+        except (FileNotFoundError, NotADirectoryError):
             return []
         
-        task_dirs = []
-        for kes_dir in subject_dir.iterdir():
-            if kes_dir.is_dir():
-                for task_dir in kes_dir.iterdir():
-                    if task_dir.is_dir() and (task_dir / "task.json").exists():
-                        task_dirs.append(task_dir)
+        with kes_entries:
+            for kes_entry in kes_entries:
+                if not kes_entry.is_dir():
+                    continue
+                with os.scandir(kes_entry.path) as task_entries:
+                    for task_entry in task_entries:
+                        if task_entry.is_dir() and os.path.isfile(os.path.join(task_entry.path, "task.json")):
+                            task_dirs.append(task_entry.path)
         
         return task_dirs
     
+    def find_task_dir_by_id(self, subject: str, task_id: str) -> Optional[str]:
+        """
+        Найти папку задания по публичному номеру (например, "0FDA4F")
+        
+        Индекс номеров строится один раз на предмет. Если номер в индексе
+        не найден или его папку удалили, индекс перестраивается (задания
+        могли сохранить другим процессом), но только если с момента
+        построения изменилось время модификации папки предмета или папок
+        КЭС. Поэтому повторный поиск отсутствующего номера стоит нескольких
+        stat(), а не чтения всех task.json
+        
+        Returns:
+            Путь к папке задания или None
+        """
+        index = self._task_id_index.get(subject)
+        if index is not None:
+            task_dir = index.get(task_id)
+            if task_dir is not None and os.path.isfile(os.path.join(task_dir, "task.json")):
+                return task_dir
+            
+            mtimes = self._task_id_index_mtimes.get(subject)
+            if mtimes is not None and mtimes == self._subject_dir_mtimes(subject):
+                return None
+        
+        index = self._build_task_id_index(subject)
+        return index.get(task_id)
+    
+    def _subject_dir_mtimes(self, subject: str) -> Tuple[Tuple[str, int], ...]:
+        """
+        Время модификации папки предмета и всех папок КЭС в ней
+        Появление или удаление папки задания меняет mtime её папки КЭС
+        """
+        subject_dir = os.path.join(self.base_dir, subject)
+        try:
+            mtimes = [(subject_dir, os.stat(subject_dir).st_mtime_ns)]
+            with os.scandir(subject_dir) as kes_entries:
+                for kes_entry in kes_entries:
+                    if kes_entry.is_dir():
+                        mtimes.append((kes_entry.path, kes_entry.stat().st_mtime_ns))
+        except (FileNotFoundError, NotADirectoryError):
+            return ()
+        mtimes.sort()
+        return tuple(mtimes)
+    
+    def _build_task_id_index(self, subject: str) -> Dict[str, str]:
+        """
+        Прочитать все задания предмета и построить индекс номер -> папка
+        Из task.json берётся только task_id, объекты Task не создаются
+        """
+        # mtime снимаются до обхода: папки, созданные во время обхода,
+        # изменят их и вызовут перестроение при следующем промахе
+        mtimes = self._subject_dir_mtimes(subject)
+        complete = True
+        
+        index = {}
+        try:
+            kes_entries = os.scandir(os.path.join(self.base_dir, subject))
+        except (FileNotFoundError, NotADirectoryError):
+            kes_entries = None
+        
+        if kes_entries is not None:
+            with kes_entries:
+                for kes_entry in kes_entries:
+                    if not kes_entry.is_dir():
+                        continue
+                    with os.scandir(kes_entry.path) as task_entries:
+                        for task_entry in task_entries:
+                            if not task_entry.is_dir():
+                                continue
+                            try:
+                                with open(os.path.join(task_entry.path, "task.json"), 'rb') as f:
+                                    task_id = _json_loads(f.read()).get('task_id')
+                            except (OSError, ValueError):
+                                # task.json ещё не записан: его появление не изменит
+                                # mtime папки КЭС, поэтому индекс считается неполным
+                                complete = False
+                                continue
+                            if task_id:
+                                index.setdefault(task_id, task_entry.path)
+        
+        self._task_id_index[subject] = index
+        self._task_id_index_mtimes[subject] = mtimes if complete else None
+        return index
+    
+    def find_tasks_by_subject(self, subject: str) -> List[Path]:
+        """Найти все задания по предмету (пути в виде Path)"""
+        return [Path(task_dir) for task_dir in self.find_task_dirs(subject)]
+    
+    def _count_tasks_in_kes(self, kes_path: str) -> int:
+        """
+        Количество заданий (папок с task.json) в папке КЭС
+        Результат кэшируется до изменения mtime папки или сохранения в неё задания
+        """
+        mtime_ns = os.stat(kes_path).st_mtime_ns
+        cached = self._kes_count_cache.get(kes_path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        
+        count = 0
+        with os.scandir(kes_path) as task_entries:
+            for task_entry in task_entries:
+                if task_entry.is_dir() and os.path.isfile(os.path.join(task_entry.path, "task.json")):
+                    count += 1
+        
+        self._kes_count_cache[kes_path] = (mtime_ns, count)
+        return count
+    
     def get_statistics(self, subject: Optional[str] = None) -> dict:
         """Получить статистику по сохранённым заданиям"""
         stats = {
@@ -184,7 +483,8 @@ class FileManager:
         if subject:
             subjects_to_check = [subject]
         else:
-            subjects_to_check = [d.name for d in self.base_dir.iterdir() if d.is_dir()]
+            with os.scandir(self.base_dir) as entries:
+                subjects_to_check = [entry.name for entry in entries if entry.is_dir()]
         
         for subj in subjects_to_check:
             subject_dir = self.base_dir / subj
@@ -194,13 +494,12 @@ class FileManager:
             task_count = 0
             kes_counts = {}
             
-            for kes_dir in subject_dir.iterdir():
-                if kes_dir.is_dir():
-                    kes_name = kes_dir.name
-                    kes_task_count = sum(1 for td in kes_dir.iterdir() 
-                                        if td.is_dir() and (td / "task.json").exists())
-                    task_count += kes_task_count
-                    kes_counts[kes_name] = kes_task_count
+            with os.scandir(subject_dir) as kes_entries:
+                for kes_entry in kes_entries:
+                    if kes_entry.is_dir():
+                        kes_task_count = self._count_tasks_in_kes(kes_entry.path)
+                        task_count += kes_task_count
+                        kes_counts[kes_entry.name] = kes_task_count
             
             stats['by_subject'][subj] = task_count
             stats['by_kes'][subj] = kes_counts
@@ -214,30 +513,52 @@ def extract_image_urls_from_html(html: str) -> List[str]:
     Извлечь URL изображений из HTML
     Ищет вызовы ShowPictureQ и src в тегах img
     """
-    urls = []
+    show_picture_urls = []
+    img_urls = []
     
-    # Паттерн для ShowPictureQ('...')
-    show_picture_pattern = r"ShowPictureQ\(['\"]([^'\"]+)['\"]\)"
-    matches = re.findall(show_picture_pattern, html)
-    urls.extend(matches)
+    # Один проход по HTML: первая группа - ShowPictureQ('...'), вторая - <img src="...">
+    for show_picture_url, img_url in IMAGE_URL_RE.findall(html):
+        if show_picture_url:
+            show_picture_urls.append(show_picture_url)
+        else:
+            img_urls.append(img_url)
     
-    # Паттерн для <img src="...">
-    img_src_pattern = r'<img[^>]+src=["\']([^"\']+)["\']'
-    matches = re.findall(img_src_pattern, html)
-    urls.extend(matches)
+    # Одна картинка может встречаться в обоих паттернах - убираем дубликаты
+    # (порядок прежний: сначала ShowPictureQ, затем img)
+    return list(dict.fromkeys(show_picture_urls + img_urls))
+
+
+def extract_image_urls_from_tag(tag) -> List[str]:
+    """
+    Извлечь URL изображений из уже разобранного элемента BeautifulSoup
+    Аналог extract_image_urls_from_html без сериализации дерева обратно в HTML:
+    ShowPictureQ ищется в атрибутах (onclick, href) и тексте <script>,
+    src берётся из тегов img
+    """
+    show_picture_urls = []
+    img_urls = []
+    
+    for element in tag.find_all(True):
+        if element.name == 'img':
+            src = element.get('src')
+            if src:
+                img_urls.append(src)
+        elif element.name == 'script' and element.string:
+            show_picture_urls.extend(SHOW_PICTURE_RE.findall(element.string))
+        
+        for value in element.attrs.values():
+            if isinstance(value, str) and 'ShowPictureQ' in value:
+                show_picture_urls.extend(SHOW_PICTURE_RE.findall(value))
     
-    return urls
+    # Одна картинка может встречаться в обоих местах - убираем дубликаты
+    return list(dict.fromkeys(show_picture_urls + img_urls))
 
 
 def clean_text(text: str) -> str:
     """Очистить текст от лишних пробелов и переносов"""
-    # Убрать множественные пробелы
-    text = re.sub(r'\s+', ' ', text)
-    # Убрать пробелы в начале и конце
-    text = text.strip()
-    # Убрать &nbsp;
-    text = text.replace('&nbsp;', ' ')
-    return text
+    # str.split() без аргументов сам схлопывает любые пробельные символы
+    # (включая неразрывный пробел \xa0) и убирает их по краям
+    return ' '.join(text.replace('&nbsp;', ' ').split())
 
 
 def parse_kes_from_metadata(metadata: dict) -> List[str]: